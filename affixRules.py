@@ -0,0 +1,178 @@
+from collections import namedtuple
+
+# A rule matches a word that starts with one of the prefixes and ends with one of the suffixes.
+# An empty tuple of prefixes or suffixes matches any word.
+AffixRule = namedtuple('AffixRule', ['tag', 'prefixes', 'suffixes'])
+
+
+def suffix(tag, *suffixes):
+    return AffixRule(tag, (), suffixes)
+
+
+def prefix(tag, *prefixes):
+    return AffixRule(tag, prefixes, ())
+
+
+# The rules of each language, in priority order: the first rule that matches a word gives its UNK tag.
+
+RULES_EN = [
+    suffix('UNK-ing', 'ing'),
+    suffix("UNK's", "'s"),
+    suffix('UNK-ion', 'ion', 'ions'),
+    suffix('UNK-ial', 'ial'),
+    suffix('UNK-ble', 'ble'),
+    suffix('UNK-er', 'er'),
+    suffix('UNK-or', 'or'),
+    suffix('UNK-al', 'al'),
+    suffix('UNK-fy', 'fy'),
+    suffix('UNK-ic', 'ic'),
+    suffix('UNK-ful', 'ful'),
+    suffix('UNK-est', 'est'),
+    suffix('UNK-less', 'less'),
+    suffix('UNK-ous', 'ous'),
+    suffix('UNK-ed', 'ed'),
+    suffix('UNK-ly', 'ly'),
+    prefix('anti-UNK', 'anti'),
+    prefix('pre-UNK', 'pre'),
+    suffix('UNK-ism', 'ism'),
+    suffix('UNK-wise', 'wise'),
+    suffix('UNK-ward', 'ward', 'wards'),
+    suffix('UNK-ist', 'ist'),
+    suffix('UNK-s', 's'),
+]
+
+RULES_DU = [
+    suffix('UNK-te', 'te'),
+    suffix('UNK-de', 'de'),
+    AffixRule('ge-UNK-(t/d)', ('ge',), ('t', 'd')),
+    suffix('UNK-tien', 'tien'),
+    suffix('UNK-honderd', 'honderd'),
+    suffix('UNK-thie', 'thie'),
+    suffix('UNK-thisch', 'thisch'),
+    suffix('UNK-achtig', 'achtig'),
+    suffix('UNK-ische', 'ische'),
+    suffix('UNK-isch', 'isch'),
+    prefix('ont-UNK', 'ont'),
+    prefix('er-UNK', 'er'),
+    suffix('UNK-en', 'en'),
+    suffix('UNK-s', 's'),
+]
+
+RULES_ES = [
+    suffix('UNK-achon', 'achon'),
+    suffix('UNK-aco', 'aco'),
+    suffix('UNK-ado', 'ado'),
+    suffix('UNK-ción', 'ción'),
+    suffix('UNK-mente', 'mente'),
+    suffix('UNK-génesis', 'génesis'),
+    suffix('UNK-able', 'able'),
+    suffix('UNK-ario', 'ario'),
+    suffix('UNK-eñ(a/o)', 'eña', 'eño'),
+    suffix('UNK-iz(a/o)', 'iza', 'izo'),
+    suffix('UNK-os(a/o)', 'oso', 'osa'),
+    suffix('UNK-or', 'or'),
+]
+
+RULES_PO = [
+    suffix('ário', 'ário'),
+    suffix('UNK-eiro', 'eiro'),
+    suffix('UNK-diminutive', 'inho', 'ico', 'isco'),
+    suffix('UNK-augmentative', 'ão', 'aço', 'aréu'),
+    suffix('UNK-mente', 'mente'),
+    prefix('anfi-UNK', 'Anfi', 'anfi'),
+    prefix('anti-UNK', 'Anti', 'anti'),
+    prefix('si(m/n)-UNK', 'sim', 'Sim', 'sin', 'Sin'),
+    prefix('peri-UNK', 'peri', 'Peri'),
+    prefix('hemi-UNK', 'Hemi', 'hemi'),
+]
+
+
+# the number of consecutive rules that share one guard in a compiled rule set
+GROUP_SIZE = 3
+
+
+def compileRules(rules, groupSize=GROUP_SIZE):
+    """
+    Compile affix rules into a Python function that tries them in priority order.
+
+    The rules are split into groups of consecutive rules, and each group is guarded by a single endswith() and
+    startswith() on all of its affixes, so a word only goes through the rules of the groups that it may match.
+
+    :param rules: A list of AffixRule in priority order
+    :param groupSize: The number of rules in each group
+    :return: A function that converts a word to the UNK tag of the first rule that matches it, or to itself
+    """
+    lines = ['def convert(word):']
+    for start in range(0, len(rules), groupSize):
+        group = rules[start:start + groupSize]
+        suffixes = tuple(s for rule in group for s in rule.suffixes)
+        # a rule with both a prefix and a suffix is covered by the guard on its suffixes
+        prefixes = tuple(p for rule in group if not rule.suffixes for p in rule.prefixes)
+        guards = []
+        if suffixes:
+            guards.append('word.endswith({!r})'.format(suffixes))
+        if prefixes:
+            guards.append('word.startswith({!r})'.format(prefixes))
+        # a rule without affixes matches every word, so nothing can skip its group
+        if any(not rule.prefixes and not rule.suffixes for rule in group):
+            guards = ['True']
+        lines.append('    if {}:'.format(' or '.join(guards)))
+
+        for rule in group:
+            conditions = []
+            if rule.prefixes:
+                conditions.append('word.startswith({!r})'.format(tuple(rule.prefixes)))
+            if rule.suffixes:
+                conditions.append('word.endswith({!r})'.format(tuple(rule.suffixes)))
+            if conditions:
+                lines.append('        if {}:'.format(' and '.join(conditions)))
+                lines.append('            return {!r}'.format(rule.tag))
+            else:
+                lines.append('        return {!r}'.format(rule.tag))
+    lines.append('    return word')
+
+    namespace = {}
+    exec(compile('\n'.join(lines), '<affix rules>', 'exec'), namespace)
+    return namespace['convert']
+
+
+class AffixRuleSet:
+    """
+    A list of affix rules compiled into a function, which gives the same result as trying the rules one by one in
+    order.
+    """
+
+    def __init__(self, rules):
+        """
+        :param rules: A list of AffixRule in priority order
+        """
+        self.rules = list(rules)
+        # convert(word) returns the UNK tag of the first rule that matches the word, or the word itself
+        self.convert = compileRules(self.rules)
+
+
+registry = {}
+
+
+def registerLanguage(lang, rules):
+    """
+    Compile the affix rules of a language and make them available to getRuleSet().
+
+    :param lang: A language code, i.e. 'en'
+    :param rules: A list of AffixRule in priority order
+    """
+    registry[lang] = AffixRuleSet(rules)
+
+
+def getRuleSet(lang):
+    """
+    :param lang: A language code
+    :return: The AffixRuleSet of the language, or None if no rules are registered for it
+    """
+    return registry.get(lang)
+
+
+registerLanguage('en', RULES_EN)
+registerLanguage('du', RULES_DU)
+registerLanguage('es', RULES_ES)
+registerLanguage('po', RULES_PO)
@@ -0,0 +1,480 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from affixRules import getRuleSet
+from hmm import HMM
+from synthetic import SyntheticCorpus
+from unk import HMM_UNK
+
+LANGUAGES = ['en', 'du', 'es', 'po']
+# the time that importing the inference-only tagger may add to the import of NumPy, in seconds
+IMPORT_BUDGET = 0.1
+
+# run in a fresh interpreter: import NumPy, then the tagger and the module of the model, then load a model file and
+# tag a sentence
+COLD_START_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+import numpy
+numpySeconds = time.perf_counter() - start
+import tagger
+importlib.import_module(tagger.MODEL_MODULES[sys.argv[2]])
+importSeconds = time.perf_counter() - start - numpySeconds
+hmm = tagger.loadModel(sys.argv[1])
+hmm.viterbiBatch([['the', 'dog']])
+print(json.dumps({'numpySeconds': numpySeconds, 'importSeconds': importSeconds,
+                  'firstTagSeconds': time.perf_counter() - start - numpySeconds - importSeconds,
+                  'nltkLoaded': 'nltk' in sys.modules}))
+"""
+
+
+# The original if/elif chains of HMM_UNK, which the compiled affix rules are checked and timed against
+
+def convertWordToUNKTag_EN(word):
+    #word = word.lower()
+    unk_tag = word
+
+    if word.endswith('ing'):
+        unk_tag = 'UNK-ing'
+    elif word.endswith("'s"):
+        unk_tag = "UNK's"
+    elif word.endswith('ion') or word.endswith('ions'):
+        unk_tag = 'UNK-ion'
+    elif word.endswith('ial'):
+        unk_tag = 'UNK-ial'
+    elif word.endswith('ble'):
+        unk_tag = 'UNK-ble'
+    elif word.endswith('er'):
+        unk_tag = 'UNK-er'
+    elif word.endswith('or'):
+        unk_tag = 'UNK-or'
+    elif word.endswith('al'):
+        unk_tag = 'UNK-al'
+    elif word.endswith('fy'):
+        unk_tag = 'UNK-fy'
+    elif word.endswith('ic'):
+        unk_tag = 'UNK-ic'
+    elif word.endswith('ful'):
+        unk_tag = 'UNK-ful'
+    elif word.endswith('est'):
+        unk_tag = 'UNK-est'
+    elif word.endswith('less'):
+        unk_tag = 'UNK-less'
+    elif word.endswith('ous'):
+        unk_tag = 'UNK-ous'
+    elif word.endswith('ed'):
+        unk_tag = 'UNK-ed'
+    elif word.endswith('ly'):
+        unk_tag = 'UNK-ly'
+    elif word.startswith('anti'):
+        unk_tag = 'anti-UNK'
+    elif word.startswith('pre'):
+        unk_tag = 'pre-UNK'
+    elif word.endswith('ism'):
+        unk_tag = 'UNK-ism'
+    elif word.endswith('wise'):
+        # i.e. otherwise, likewise, clockwise
+        unk_tag = 'UNK-wise'
+    elif word.endswith('ward') or word.endswith('wards'):
+        # i.e. forward, backward
+        unk_tag = 'UNK-ward'
+    elif word.endswith('ist'):
+        unk_tag = 'UNK-ist'
+    elif word.endswith('s'):
+        unk_tag = 'UNK-s'
+
+    return unk_tag
+
+
+def convertWordToUNKTag_DU(word):
+    unk_tag = word
+
+    if word.endswith('te'):
+        # used for adjectives
+        unk_tag = 'UNK-te'
+    elif word.endswith('de'):
+        # form ordinal numbers to cardinal numbers
+        unk_tag = 'UNK-de'
+    elif word.startswith('ge') and (word.endswith('t') or word.endswith('d')):
+        # pp -> ge + word + t/d
+        unk_tag = 'ge-UNK-(t/d)'
+    elif word.endswith('tien'):
+        # tien is equal to teen in English
+        unk_tag = 'UNK-tien'
+    elif word.endswith('honderd'):
+        #honderd = hundred
+        unk_tag = 'UNK-honderd'
+    elif word.endswith('thie'):
+        # 'thie' endings are the equivalents of the English -thy (sympathy) and -thic.
+        # 'thie' is used for nouns
+        unk_tag = 'UNK-thie'
+    elif word.endswith('thisch'):
+        # 'thisch' endings are the equivalents of the English -thy (sympathy) and -thic.
+        # 'thisch' is used for nouns
+        unk_tag = 'UNK-thisch'
+    elif word.endswith('achtig'):
+        # '-achtig' is the Dutch translation for English '-like'
+        unk_tag = 'UNK-achtig'
+    elif word.endswith('ische'):
+        # Many Dutch adjectives end in -isch or -ische (inflected).
+        # It means something like English -ish.
+        unk_tag = 'UNK-ische'
+    elif word.endswith('isch'):
+        unk_tag = 'UNK-isch'
+    elif word.startswith('ont'):
+        # prefix "ont-"
+        unk_tag = 'ont-UNK'
+    elif word.startswith('er'):
+        # prefix "er-"
+        unk_tag = 'er-UNK'
+    elif word.endswith('en'):
+        # A suffix “-en” forms verbs from nouns or adjectives.
+        unk_tag = 'UNK-en'
+    elif word.endswith('s'):
+        # forms regular plurals of nouns that end in certain suffixes or syllables
+        unk_tag = 'UNK-s'
+
+    return unk_tag
+
+
+def convertWordToUNKTag_ES(word):
+    unk_tag = word
+
+    if word.endswith('achon'):
+        # Adds negative connotations to a word
+        unk_tag = 'UNK-achon'
+    elif word.endswith('aco'):
+        # It sometimes adds a despective sense, it is also seen to add a demonym
+        unk_tag = 'UNK-aco'
+    elif word.endswith('ado'):
+        # Makes reference to names of associations or ensembles
+        unk_tag = 'UNK-ado'
+    elif word.endswith('ción'):
+        # Expresses the idea of action on nouns that are derived from a verb
+        unk_tag = 'UNK-ción'
+    elif word.endswith('mente'):
+        # Uses adjectives to form modal adverbs
+        unk_tag = 'UNK-mente'
+    elif word.endswith('génesis'):
+        # Transmits the idea of origin or beginning
+        unk_tag = 'UNK-génesis'
+
+    # suffixes that makes the words to nouns or adjectives
+    elif word.endswith('able'):
+        unk_tag = 'UNK-able'
+    elif word.endswith('ario'):
+        unk_tag = 'UNK-ario'
+    elif word.endswith('eña') or word.endswith('eño'):
+        unk_tag = 'UNK-eñ(a/o)'
+    elif word.endswith('iza') or word.endswith('izo'):
+        unk_tag = 'UNK-iz(a/o)'
+    elif word.endswith('oso') or word.endswith('osa'):
+        unk_tag = 'UNK-os(a/o)'
+    elif word.endswith('or'):
+        unk_tag = 'UNK-or'
+
+    return unk_tag
+
+
+def convertWordToUNKTag_PO(word):
+    unk_tag = word
+
+    if word.endswith('ário'):
+        # ário is a suffix that is used for "professional" or "place"
+        unk_tag = 'ário'
+    elif word.endswith('eiro'):
+        # eiro is a suffix that is used for "professional"
+        unk_tag = 'UNK-eiro'
+    elif word.endswith('inho') or word.endswith('ico') or word.endswith('isco'):
+        # inho, ico, and isco are the diminutive suffixes
+        # inho is much more used than the other diminutive suffixes
+        unk_tag = 'UNK-diminutive'
+    elif word.endswith('ão') or word.endswith('aço') or word.endswith('aréu'):
+        # ão, aço, and aréu are the augmentative suffixes
+        unk_tag = 'UNK-augmentative'
+    elif word.endswith('mente'):
+        # mente is a suffix that is generally used for adverbs
+        # It does similar thing with "-ly" in English
+        unk_tag = 'UNK-mente'
+    elif word.startswith('Anfi') or word.startswith('anfi'):
+        # prefix for dualty
+        unk_tag = 'anfi-UNK'
+    elif word.startswith('Anti') or word.startswith('anti'):
+        # prefix for opposition
+        unk_tag = 'anti-UNK'
+    elif word.startswith('sim') or word.startswith('Sim') or word.startswith('sin') or word.startswith('Sin'):
+        # "simultaneously"
+        unk_tag = 'si(m/n)-UNK'
+    elif word.startswith('peri') or word.startswith('Peri'):
+        # "Around"
+        unk_tag = 'peri-UNK'
+    elif word.startswith('Hemi') or word.startswith('hemi'):
+        # "Half"
+        unk_tag = 'hemi-UNK'
+
+    return unk_tag
+
+
+def generateAffixWords(ruleSet, numOfWords=100000, seed=0):
+    """
+    Generate words that combine random stems with the prefixes and suffixes of the given rules.
+
+    :param ruleSet: An AffixRuleSet
+    :param numOfWords: The number of words to generate
+    :param seed: The random seed
+    :return words: A list of words
+    """
+    rng = random.Random(seed)
+    prefixes = [''] + [p for rule in ruleSet.rules for p in rule.prefixes]
+    suffixes = [''] + [s for rule in ruleSet.rules for s in rule.suffixes]
+    letters = 'abcdefghijklmnopqrstuvwxyzáéñ'
+
+    words = []
+    for _ in range(numOfWords):
+        stem = ''.join(rng.choice(letters) for _ in range(rng.randint(0, 6)))
+        words.append(rng.choice(prefixes) + stem + rng.choice(suffixes))
+    return words
+
+
+def benchAffixRules(numOfWords=100000, seed=0):
+    """
+    Compare the compiled affix rules with the convertWordToUNKTag_* chains.
+
+    :return results: A dictionary that maps each language to the throughput of both implementations
+    """
+    chains = {
+        'en': convertWordToUNKTag_EN,
+        'du': convertWordToUNKTag_DU,
+        'es': convertWordToUNKTag_ES,
+        'po': convertWordToUNKTag_PO,
+    }
+
+    results = {}
+    for lang in LANGUAGES:
+        ruleSet = getRuleSet(lang)
+        words = generateAffixWords(ruleSet, numOfWords, seed)
+
+        start = time.perf_counter()
+        expected = [chains[lang](w) for w in words]
+        chainTime = time.perf_counter() - start
+
+        start = time.perf_counter()
+        converted = [ruleSet.convert(w) for w in words]
+        compiledTime = time.perf_counter() - start
+
+        mismatches = sum(1 for a, b in zip(expected, converted) if a != b)
+        results[lang] = {
+            'words': numOfWords,
+            'mismatches': mismatches,
+            'chainWordsPerSec': numOfWords / chainTime,
+            'compiledWordsPerSec': numOfWords / compiledTime,
+            'speedup': chainTime / compiledTime,
+        }
+    return results
+
+
+def measure(function, memory=True):
+    """
+    Run a function, and measure its wall time and, optionally, its peak traced memory in a second run.
+
+    The memory is measured in a separate run, as tracing the allocations slows the function down.
+
+    :param function: A function without arguments
+    :param memory: Whether to measure the peak memory
+    :return result: The result of the first run
+    :return phase: A dictionary with the wall time and the peak memory of the function
+    """
+    start = time.perf_counter()
+    result = function()
+    phase = {'seconds': time.perf_counter() - start}
+
+    if memory:
+        tracemalloc.start()
+        function()
+        phase['peakBytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result, phase
+
+
+def benchModel(modelClass, corpus, trainSize, testSize, memory=True, workers=None, **kwargs):
+    """
+    Benchmark the training and the decoding of a model on a corpus.
+
+    :param workers: The number of worker processes of viterbiParallel, or None for the number of CPUs
+    :return results: A dictionary that maps each phase to its measurements
+    """
+    hmm = modelClass(corpus, "", trainSize=trainSize, testSize=testSize, **kwargs)
+    results = {}
+
+    _, results['setup'] = measure(hmm.setup, memory)
+    trainTokens = sum(len(s) for s in hmm.trainSents)
+    results['setup']['tokensPerSec'] = trainTokens / results['setup']['seconds']
+
+    _, results['compile'] = measure(hmm.compile, memory)
+
+    def coldStart(decode):
+        # start every run of a decoder with an empty emission cache
+        def run():
+            hmm.emissionCache.clear()
+            return decode()
+        return run
+
+    testTokens = sum(len(s) for s in hmm.testingWordsNoDelim)
+    decoders = {
+        'viterbi': lambda: [hmm.decodeSentence(s) for s in hmm.testingWordsNoDelim],
+        'viterbiBatch': hmm.viterbiBatch,
+    }
+    for name, decode in decoders.items():
+        _, results[name] = measure(coldStart(decode), memory)
+        results[name]['tokensPerSec'] = testTokens / results[name]['seconds']
+
+    # the memory of the workers is not traced, and every run starts with an empty emission cache in each worker
+    _, results['viterbiParallel'] = measure(lambda: hmm.viterbiParallel(workers=workers), memory=False)
+    results['viterbiParallel']['workers'] = workers or multiprocessing.cpu_count()
+    results['viterbiParallel']['tokensPerSec'] = testTokens / results['viterbiParallel']['seconds']
+    results['viterbiParallel']['speedupOverBatch'] = \
+        results['viterbiBatch']['seconds'] / results['viterbiParallel']['seconds']
+
+    return results
+
+
+def benchUnkConversion(corpus, lang='en'):
+    """
+    Measure the throughput of the UNK conversion over every token of the corpus.
+    """
+    hmm = HMM_UNK.__new__(HMM_UNK)
+    hmm.lang = lang
+    words = [w for s in corpus.tagged_sents() for (w, _) in s]
+
+    _, phase = measure(lambda: [hmm.convertWordToUNKTag(w) for w in words], memory=False)
+    phase['tokensPerSec'] = len(words) / phase['seconds']
+    return phase
+
+
+def benchColdStart(repeats=5, budget=IMPORT_BUDGET):
+    """
+    Measure the import time of the inference-only tagger in fresh interpreters, and check it against a budget.
+
+    Each model class is saved to a model file, which a fresh interpreter loads with the tagger and tags a sentence
+    with, so NLTK must stay unloaded for every model class.
+
+    :param repeats: The number of fresh interpreters for each model class; the medians are reported
+    :param budget: The number of seconds that importing the tagger may add to the import of NumPy
+    :return report: A dictionary with the medians of each model class, and whether the budget was kept
+    """
+    from trigram import TrigramHMM, TrigramHMM_UNK
+    corpus = SyntheticCorpus(numOfSents=500, vocabSize=2000)
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    report = {'budgetSeconds': budget, 'models': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for modelClass in [HMM, HMM_UNK, TrigramHMM, TrigramHMM_UNK]:
+            hmm = modelClass(corpus, trainSize=450, testSize=50)
+            hmm.setup()
+            path = os.path.join(tmp, modelClass.__name__ + '.hmm')
+            hmm.save(path)
+
+            command = [sys.executable, '-c', COLD_START_SCRIPT, path, modelClass.__name__]
+            runs = [json.loads(subprocess.run(command, cwd=directory, check=True, capture_output=True, text=True).stdout)
+                    for _ in range(repeats)]
+            result = {k: float(np.median([r[k] for r in runs]))
+                      for k in ['numpySeconds', 'importSeconds', 'firstTagSeconds']}
+            result['nltkLoaded'] = any(r['nltkLoaded'] for r in runs)
+            report['models'][modelClass.__name__] = result
+
+    report['withinBudget'] = all(r['importSeconds'] <= budget and not r['nltkLoaded']
+                                 for r in report['models'].values())
+    return report
+
+
+def runBenchmarks(numOfSents=5000, vocabSize=20000, numOfTags=12, meanLength=20, zipf=1.1, seed=0, memory=True,
+                  workers=None):
+    """
+    Run the benchmark suite on a synthetic corpus.
+
+    90% of the sentences are used for training, and the rest for testing.
+
+    :return report: A JSON serialisable dictionary with the configuration and the results
+    """
+    corpus = SyntheticCorpus(numOfSents, vocabSize, numOfTags, meanLength, zipf, seed=seed)
+    trainSize = numOfSents * 9 // 10
+    testSize = numOfSents - trainSize
+
+    return {
+        'config': corpus.config,
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()},
+        'results': {
+            'HMM': benchModel(HMM, corpus, trainSize, testSize, memory, workers),
+            'HMM_UNK': benchModel(HMM_UNK, corpus, trainSize, testSize, memory, workers, lang='en'),
+            'unkConversion': benchUnkConversion(corpus),
+        },
+    }
+
+
+def main_run(args):
+    parser = argparse.ArgumentParser(prog='benchmark.py run', description='Run the benchmark suite on a synthetic corpus.')
+    parser.add_argument('--sents', type=int, default=5000, help='number of sentences')
+    parser.add_argument('--vocab', type=int, default=20000, help='number of distinct words')
+    parser.add_argument('--tags', type=int, default=12, help='number of distinct tags')
+    parser.add_argument('--length', type=float, default=20, help='mean sentence length')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent of the word frequencies')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurements')
+    parser.add_argument('--workers', type=int, help='number of worker processes of viterbiParallel, by default the '
+                                                    'number of CPUs')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    options = parser.parse_args(args)
+
+    report = runBenchmarks(options.sents, options.vocab, options.tags, options.length, options.zipf, options.seed,
+                           not options.no_memory, options.workers)
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def main_affix():
+    results = benchAffixRules()
+    for lang, r in results.items():
+        print('{}: chain {:.0f} words/s, compiled {:.0f} words/s, speedup {:.2f}x, mismatches {}'.format(
+            lang, r['chainWordsPerSec'], r['compiledWordsPerSec'], r['speedup'], r['mismatches']))
+    if any(r['mismatches'] for r in results.values()):
+        exit(1)
+
+
+def main_coldstart(args):
+    parser = argparse.ArgumentParser(prog='benchmark.py coldstart',
+                                     description='Check the import time of the inference-only tagger against a budget.')
+    parser.add_argument('--repeats', type=int, default=5, help='number of fresh interpreters for each model class')
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET,
+                        help='seconds that importing the tagger may add to importing NumPy')
+    options = parser.parse_args(args)
+
+    report = benchColdStart(options.repeats, options.budget)
+    print(json.dumps(report, indent=2))
+    if not report['withinBudget']:
+        exit(1)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'affix':
+        main_affix()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'coldstart':
+        main_coldstart(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'run':
+        main_run(sys.argv[2:])
+    else:
+        print('Usage: python3 benchmark.py run [options] | python3 benchmark.py affix | python3 benchmark.py coldstart [options]')
+        exit(1)
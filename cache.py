@@ -0,0 +1,159 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A bounded mapping that evicts the least recently used entry when it is full.
+    """
+
+    def __init__(self, maxsize=10000):
+        """
+        :param maxsize: The maximum number of entries; 0 disables the cache
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        :param key: The key to look up
+        :return: The cached value, or None if the key is not cached
+        """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        Cache the value, evicting the least recently used entry if the cache is full.
+
+        :return: The evicted (key, value) pair, or None if nothing was evicted
+        """
+        if self.maxsize <= 0:
+            return None
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.evictions += 1
+            return self.entries.popitem(last=False)
+        return None
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        """
+        :return: A dictionary with the size and the hit/miss/eviction counters of the cache
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hitRate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SentenceCache:
+    """
+    A bounded cache of the tags of whole sentences, for streams with many exact-duplicate sentences.
+
+    The entries in memory are keyed on the token tuple and the decoding options, and belong to the model with the
+    current fingerprint; they are dropped when the fingerprint changes, i.e. after update(). With a spill path, the
+    entries that are evicted from memory are written to a dbm file, keyed on a hash of the model fingerprint, the
+    tokens and the options, so the file can be reused by later runs of the same model. The file is not bounded.
+    """
+
+    def __init__(self, maxsize=10000, spillPath=None):
+        """
+        :param maxsize: The maximum number of sentences in memory
+        :param spillPath: The path of a dbm file for the evicted sentences, or None to discard them
+        """
+        self.memory = LRUCache(maxsize)
+        self.spillPath = spillPath
+        self.spill = None
+        if spillPath is not None:
+            import dbm
+            self.spill = dbm.open(spillPath, 'c')
+        self.fingerprint = None
+        self.diskHits = 0
+        self.spilled = 0
+        self.batchDuplicates = 0
+
+    def setFingerprint(self, fingerprint):
+        """
+        :param fingerprint: The fingerprint of the compiled model that the cached tags come from
+        """
+        if fingerprint != self.fingerprint:
+            self.memory.clear()
+            self.fingerprint = fingerprint
+
+    @staticmethod
+    def key(sentence, beamWidth=None, beamThreshold=None):
+        """
+        :return: The key of a sentence that is tagged with the given decoding options
+        """
+        return tuple(sentence), beamWidth, beamThreshold
+
+    def diskKey(self, key):
+        tokens, beamWidth, beamThreshold = key
+        text = json.dumps([self.fingerprint, tokens, beamWidth, beamThreshold])
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, key):
+        """
+        :return: The cached tuple of tags, or None if the sentence is not cached
+        """
+        tags = self.memory.get(key)
+        if tags is None and self.spill is not None:
+            value = self.spill.get(self.diskKey(key))
+            if value is not None:
+                self.diskHits += 1
+                tags = tuple(json.loads(value))
+                self.put(key, tags)
+        return tags
+
+    def put(self, key, tags):
+        evicted = self.memory.put(key, tuple(tags))
+        if evicted is not None and self.spill is not None:
+            evictedKey, evictedTags = evicted
+            self.spill[self.diskKey(evictedKey)] = json.dumps(evictedTags)
+            self.spilled += 1
+
+    def close(self):
+        """
+        Close the spill file.
+        """
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    def stats(self):
+        """
+        :return: A dictionary with the counters of the memory cache, the hits of the spill file, and the hit rate over
+                 all lookups, where a duplicate within a batch is a hit that was never looked up in the cache
+        """
+        stats = self.memory.stats()
+        # a sentence that is found in the spill file was first a miss of the memory cache
+        lookups = self.memory.hits + self.memory.misses + self.batchDuplicates
+        hits = self.memory.hits + self.diskHits + self.batchDuplicates
+        stats.update({
+            'diskHits': self.diskHits,
+            'spilled': self.spilled,
+            'batchDuplicates': self.batchDuplicates,
+            'hitRate': hits / lookups if lookups else 0.0,
+        })
+        return stats
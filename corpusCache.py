@@ -0,0 +1,144 @@
+import os
+from array import array
+import numpy as np
+from modelFile import writeModel, readModel, encodeStrings, decodeStrings
+
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+# the NLTK data packages that are needed to read a corpus with a tagset
+TAGSET_PACKAGES = {'universal': ['universal_tagset']}
+
+
+def cachePath(name, tagset, directory=CACHE_DIR):
+    """
+    :return: The path of the cache file of the corpus with the given tagset
+    """
+    return os.path.join(directory, '{}-{}-v{}.corpus'.format(name, tagset or 'default', CACHE_VERSION))
+
+
+def buildCorpusCache(corpus, name, tagset, path):
+    """
+    Read a corpus once, and write its tagged sentences as integer-encoded arrays to a cache file.
+
+    :param corpus: An NLTK corpus reader
+    :param name: The name of the corpus
+    :param tagset: The tagset that the corpus is read with
+    :param path: The path of the cache file
+    """
+    wordIndex = {}
+    tagIndex = {}
+    wordIds = array('i')
+    tagIds = array('i')
+    offsets = array('q', [0])
+
+    for s in corpus.tagged_sents(tagset=tagset):
+        for (w, t) in s:
+            wordIds.append(wordIndex.setdefault(w, len(wordIndex)))
+            tagIds.append(tagIndex.setdefault(t, len(tagIndex)))
+        offsets.append(len(wordIds))
+
+    wordBlob, wordOffsets = encodeStrings(list(wordIndex))
+    tagBlob, tagOffsets = encodeStrings(list(tagIndex))
+    header = {'corpus': name, 'tagset': tagset, 'cacheVersion': CACHE_VERSION}
+    arrays = {
+        'wordIds': np.frombuffer(wordIds, dtype=np.int32),
+        'tagIds': np.frombuffer(tagIds, dtype=np.int32),
+        'sentenceOffsets': np.frombuffer(offsets, dtype=np.int64),
+        'wordBlob': wordBlob,
+        'wordOffsets': wordOffsets,
+        'tagBlob': tagBlob,
+        'tagOffsets': tagOffsets,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # the file is written atomically, so that an interrupted build does not leave a broken cache behind
+    writeModel(path, header, arrays)
+
+
+class CachedSentences:
+    """
+    A lazy sequence of the sentences of a cached corpus, which are decoded when they are accessed.
+    """
+
+    def __init__(self, corpus, tagged, start=0, stop=None):
+        self.corpus = corpus
+        self.tagged = tagged
+        self.start = start
+        self.stop = corpus.numOfSents if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return CachedSentences(self.corpus, self.tagged, self.start + start, self.start + max(start, stop))
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('sentence index out of range')
+        return self.corpus.sentence(self.start + index, self.tagged)
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield self.corpus.sentence(i, self.tagged)
+
+
+class CachedCorpus:
+    """
+    A corpus that is read from a cache file, with the tagged_sents() and sents() methods of an NLTK corpus reader.
+    """
+
+    def __init__(self, path):
+        header, arrays = readModel(path)
+        if header.get('cacheVersion') != CACHE_VERSION:
+            raise ValueError('{} is not a corpus cache of version {}'.format(path, CACHE_VERSION))
+
+        self.name = header['corpus']
+        self.tagset = header['tagset']
+        self.words = decodeStrings(arrays['wordBlob'], arrays['wordOffsets'])
+        self.tags = decodeStrings(arrays['tagBlob'], arrays['tagOffsets'])
+        self.wordIds = arrays['wordIds']
+        self.tagIds = arrays['tagIds']
+        self.sentenceOffsets = arrays['sentenceOffsets']
+        self.numOfSents = len(self.sentenceOffsets) - 1
+
+    def sentence(self, i, tagged=True):
+        start, end = int(self.sentenceOffsets[i]), int(self.sentenceOffsets[i + 1])
+        words = [self.words[w] for w in self.wordIds[start:end].tolist()]
+        if not tagged:
+            return words
+        return list(zip(words, [self.tags[t] for t in self.tagIds[start:end].tolist()]))
+
+    def tagged_sents(self, tagset=None):
+        if tagset is not None and tagset != self.tagset:
+            raise ValueError('The {} cache was built with the tagset "{}", not "{}"'.format(self.name, self.tagset, tagset))
+        return CachedSentences(self, True)
+
+    def sents(self):
+        return CachedSentences(self, False)
+
+
+def openCorpus(name, tagset="", directory=CACHE_DIR):
+    """
+    Open a corpus from its cache file, and build the cache file first if it does not exist.
+
+    NLTK is only imported, and the corpus only downloaded, when the cache file has to be built.
+
+    :param name: The name of an NLTK corpus, i.e. 'brown'
+    :param tagset: The tagset that the corpus is read with
+    :param directory: The directory of the cache files
+    :return: A CachedCorpus
+    """
+    path = cachePath(name, tagset, directory)
+    if not os.path.exists(path):
+        import nltk
+        for package in [name] + TAGSET_PACKAGES.get(tagset, []):
+            nltk.download(package)
+        buildCorpusCache(getattr(nltk.corpus, name), name, tagset, path)
+
+    return CachedCorpus(path)
@@ -0,0 +1,220 @@
+import numpy as np
+
+
+def viterbiDecode(logStart, logTransition, logEmissions):
+    """
+    Find the most likely tag sequence for one sentence in log space.
+
+    :param logStart: An array of shape (T,) with log P(t | <s>)
+    :param logTransition: An array of shape (T, T) with log P(cur | prev), indexed as [prev, cur]
+    :param logEmissions: An array of shape (n, T) with log P(word_i | t) for each word of the sentence
+    :return path: A list of n tag indices
+    """
+    numOfWords = len(logEmissions)
+    if numOfWords == 0:
+        return []
+
+    numOfTags = len(logStart)
+    tagRange = np.arange(numOfTags)
+    backPointers = np.zeros((numOfWords, numOfTags), dtype=np.intp)
+
+    scores = logStart + logEmissions[0]
+    for i in range(1, numOfWords):
+        # candidates[prev, cur] = score of the best path ending in prev, followed by prev -> cur
+        candidates = scores[:, None] + logTransition
+        backPointers[i] = candidates.argmax(axis=0)
+        scores = candidates[backPointers[i], tagRange] + logEmissions[i]
+
+    # follow the back pointers from the best final state
+    path = [int(scores.argmax())]
+    for i in range(numOfWords - 1, 0, -1):
+        path.append(int(backPointers[i][path[-1]]))
+    path.reverse()
+
+    return path
+
+
+def viterbiDecodeBatch(logStart, logTransition, logEmissions, lengths):
+    """
+    Find the most likely tag sequences for a batch of padded sentences in log space.
+
+    :param logStart: An array of shape (T,) with log P(t | <s>)
+    :param logTransition: An array of shape (T, T) with log P(cur | prev), indexed as [prev, cur]
+    :param logEmissions: An array of shape (B, n, T), where positions beyond the length of a sentence are padding
+    :param lengths: An array of shape (B,) with the number of words of each sentence
+    :return paths: A list of B lists of tag indices
+    """
+    batchSize, maxLength, numOfTags = logEmissions.shape
+    if maxLength == 0:
+        return [[] for _ in range(batchSize)]
+
+    lengths = np.asarray(lengths)
+    tagRange = np.arange(numOfTags)
+    batchRange = np.arange(batchSize)
+    backPointers = np.empty((maxLength, batchSize, numOfTags), dtype=np.intp)
+    backPointers[0] = tagRange
+
+    scores = logStart + logEmissions[:, 0]
+    for i in range(1, maxLength):
+        # candidates[b, prev, cur] = score of the best path ending in prev, followed by prev -> cur
+        candidates = scores[:, :, None] + logTransition
+        best = candidates.argmax(axis=1)
+        newScores = np.take_along_axis(candidates, best[:, None, :], axis=1)[:, 0] + logEmissions[:, i]
+
+        # padding keeps the scores as they are and points every state back to itself
+        active = (i < lengths)[:, None]
+        scores = np.where(active, newScores, scores)
+        backPointers[i] = np.where(active, best, tagRange)
+
+    # follow the back pointers from the best final state of every sentence
+    paths = np.empty((batchSize, maxLength), dtype=np.intp)
+    state = scores.argmax(axis=1)
+    for i in range(maxLength - 1, -1, -1):
+        paths[:, i] = state
+        state = backPointers[i][batchRange, state]
+
+    return [paths[b, :lengths[b]].tolist() for b in range(batchSize)]
+
+
+def checkBeam(beamWidth=None, beamThreshold=None):
+    """
+    Check the beam parameters, before a sentence is decoded with them.
+
+    :param beamWidth: The maximum number of states that are kept at each position, or None for no limit
+    :param beamThreshold: Only states within this log probability of the best state are kept, or None for no limit
+    """
+    if beamWidth is not None and beamWidth < 1:
+        raise ValueError('beamWidth must be at least 1, not {}'.format(beamWidth))
+    if beamThreshold is not None and beamThreshold < 0:
+        raise ValueError('beamThreshold must not be negative, not {}'.format(beamThreshold))
+
+
+def viterbiBeamDecode(logStart, logTransition, logEmissions, beamWidth=None, beamThreshold=None):
+    """
+    Find a likely tag sequence for one sentence, keeping only the best states at each position.
+
+    Only the states in the beam are extended to the next position, so a step costs O(K x T) instead of O(T x T).
+    The result is the exact Viterbi path whenever the exact path never leaves the beam.
+
+    :param logStart: An array of shape (T,) with log P(t | <s>)
+    :param logTransition: An array of shape (T, T) with log P(cur | prev), indexed as [prev, cur]
+    :param logEmissions: An array of shape (n, T) with log P(word_i | t) for each word of the sentence
+    :param beamWidth: The maximum number of states that are kept at each position, or None for no limit
+    :param beamThreshold: Only states within this log probability of the best state are kept, or None for no limit
+    :return path: A list of n tag indices
+    """
+    checkBeam(beamWidth, beamThreshold)
+    numOfWords = len(logEmissions)
+    if numOfWords == 0:
+        return []
+
+    numOfTags = len(logStart)
+    backPointers = np.zeros((numOfWords, numOfTags), dtype=np.intp)
+
+    scores = logStart + logEmissions[0]
+    for i in range(1, numOfWords):
+        beam = np.arange(numOfTags)
+        if beamWidth is not None and beamWidth < numOfTags:
+            beam = np.argpartition(-scores, beamWidth - 1)[:beamWidth]
+        if beamThreshold is not None:
+            beam = beam[scores[beam] >= scores.max() - beamThreshold]
+
+        # candidates[k, cur] = score of the best path ending in the k-th state of the beam, followed by -> cur
+        candidates = scores[beam][:, None] + logTransition[beam]
+        best = candidates.argmax(axis=0)
+        backPointers[i] = beam[best]
+        scores = candidates[best, np.arange(numOfTags)] + logEmissions[i]
+
+    # follow the back pointers from the best final state
+    path = [int(scores.argmax())]
+    for i in range(numOfWords - 1, 0, -1):
+        path.append(int(backPointers[i][path[-1]]))
+    path.reverse()
+
+    return path
+
+
+def viterbiRestrictedDecode(logStart, logTransition, logEmissions, candidates):
+    """
+    Find the most likely tag sequence for one sentence, where each word may only take some of the tags.
+
+    Only the allowed states are scored, so a step costs O(|prev| x |cur|) instead of O(T x T). The result is the
+    same as exact decoding with the log emission probabilities of all other tags set to -inf.
+
+    :param logStart: An array of shape (T,) with log P(t | <s>)
+    :param logTransition: An array of shape (T, T) with log P(cur | prev), indexed as [prev, cur]
+    :param logEmissions: An array of shape (n, T) with log P(word_i | t) for each word of the sentence
+    :param candidates: A list of n arrays with the allowed tag indices of each word
+    :return path: A list of n tag indices
+    """
+    numOfWords = len(logEmissions)
+    if numOfWords == 0:
+        return []
+
+    backPointers = [None]
+    scores = logStart[candidates[0]] + logEmissions[0][candidates[0]]
+    for i in range(1, numOfWords):
+        prev, cur = candidates[i - 1], candidates[i]
+        # stepScores[k, m] = score of the best path ending in prev[k], followed by prev[k] -> cur[m]
+        stepScores = scores[:, None] + logTransition[prev[:, None], cur]
+        best = stepScores.argmax(axis=0)
+        backPointers.append(best)
+        scores = stepScores[best, np.arange(len(cur))] + logEmissions[i][cur]
+
+    # follow the back pointers from the best final state, as positions within the candidates
+    position = int(scores.argmax())
+    path = [int(candidates[-1][position])]
+    for i in range(numOfWords - 1, 0, -1):
+        position = int(backPointers[i][position])
+        path.append(int(candidates[i - 1][position]))
+    path.reverse()
+
+    return path
+
+
+def viterbiPairDecode(logStart, predIndex, logPredTransition, logEnd, pairTags, logEmissions):
+    """
+    Find the most likely tag sequence for one sentence under a trigram model, over a sparse set of tag pair states.
+
+    A state (u, v) stands for the tags of the previous and the current word. The predecessors of (u, v) are the
+    states (w, u), so a step costs O(P * K) for P states with at most K predecessors each, instead of O(T^3).
+
+    :param logStart: An array of shape (P,) with log P(v | <s>, <s>) for the states (<s>, v), and -inf for the others
+    :param predIndex: An array of shape (P, K) with the predecessor states of each state, padded with any state
+    :param logPredTransition: An array of shape (P, K) with log P(v | w, u) for each predecessor (w, u) of (u, v),
+                              and -inf for padding
+    :param logEnd: An array of shape (P,) with log P(</s> | u, v)
+    :param pairTags: An array of shape (P,) with the current tag v of each state
+    :param logEmissions: An array of shape (n, T) with log P(word_i | t) for each word of the sentence
+    :return path: A list of n tag indices, or None if no sequence of states can produce the sentence
+    """
+    numOfWords = len(logEmissions)
+    if numOfWords == 0:
+        return []
+
+    numOfPairs = len(pairTags)
+    pairRange = np.arange(numOfPairs)
+    backPointers = np.zeros((numOfWords, numOfPairs), dtype=np.intp)
+    # the emissions only depend on the current tag of a state
+    pairEmissions = logEmissions[:, pairTags]
+
+    scores = logStart + pairEmissions[0]
+    for i in range(1, numOfWords):
+        # candidates[p, k] = score of the best path ending in the k-th predecessor of p, followed by p
+        candidates = scores[predIndex] + logPredTransition
+        best = candidates.argmax(axis=1)
+        backPointers[i] = predIndex[pairRange, best]
+        scores = candidates[pairRange, best] + pairEmissions[i]
+
+    scores = scores + logEnd
+    state = int(scores.argmax())
+    if scores[state] == -np.inf:
+        return None
+
+    # follow the back pointers from the best final state
+    states = [state]
+    for i in range(numOfWords - 1, 0, -1):
+        states.append(int(backPointers[i][states[-1]]))
+    states.reverse()
+
+    return [int(pairTags[p]) for p in states]
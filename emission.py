@@ -0,0 +1,183 @@
+import numpy as np
+
+
+class EmissionTable:
+    """
+    Compiled emission probabilities in log space.
+
+    The table is stored in a CSR layout with one row per word of the vocabulary, so the non-zero entries of a word
+    are the tags that emitted it in the training corpus. Every other (word, tag) pair gets the probability that
+    the smoothed distribution of the tag reserves for unseen words.
+    """
+
+    def __init__(self, vocabulary, indptr, indices, data, unseen):
+        """
+        :param vocabulary: A list of words, where the position of a word is its row in the table
+        :param indptr: An array of shape (V+1,) with the start of the row of each word in indices and data
+        :param indices: An array with the tag index of each stored entry
+        :param data: An array with log P(word | tag) of each stored entry
+        :param unseen: An array of shape (T,) with log P(word | tag) for words that the tag never emitted
+        """
+        self.vocabulary = vocabulary
+        self.wordIndex = {w: i for i, w in enumerate(vocabulary)}
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.unseen = unseen
+        self.unseen.flags.writeable = False
+
+    @classmethod
+    def fromCounts(cls, emissionCounts, tags, smoothing):
+        """
+        Smooth the per-tag emission counts, and compile them into an emission table.
+
+        :param emissionCounts: A dictionary that maps each tag to a dictionary of the counts of the words that it emits
+        :param tags: A list of tags, where the position of a tag is its index in the table
+        :param smoothing: A Smoothing
+        :return: An EmissionTable
+        """
+        vocabulary = []
+        wordIndex = {}
+        unseen = np.empty(len(tags))
+        tagRows = {}
+        for j, t in enumerate(tags):
+            tagRows[j], unseen[j] = cls.tagRow(emissionCounts[t], smoothing, vocabulary, wordIndex)
+        return cls.fromTagRows(vocabulary, tagRows, unseen)
+
+    @staticmethod
+    def tagRow(counts, smoothing, vocabulary, wordIndex):
+        """
+        Compute log P(word | tag) for the words that a tag emitted.
+
+        :param counts: A dictionary of the counts of the words that the tag emitted
+        :param smoothing: A Smoothing
+        :param vocabulary: A list of words, which new words are appended to
+        :param wordIndex: A dictionary that maps each word of the vocabulary to its position, which is kept in sync
+        :return row: A pair of an array with the positions of the words in the vocabulary, and an array with
+                     log P(word | tag) of each word
+        :return logUnseen: log P(word | tag) for words that the tag never emitted
+        """
+        for w in counts:
+            if w not in wordIndex:
+                wordIndex[w] = len(vocabulary)
+                vocabulary.append(w)
+        wordIds = np.fromiter((wordIndex[w] for w in counts), dtype=np.int64, count=len(counts))
+        logProbs, logUnseen = smoothing.rowLogProbs(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+        return (wordIds, logProbs), logUnseen
+
+    @classmethod
+    def fromTagRows(cls, vocabulary, tagRows, unseen, entries=None):
+        """
+        Assemble an emission table from the rows of its tags.
+
+        :param vocabulary: A list of words
+        :param tagRows: A dictionary that maps tag indices to (wordIds, logProbs) pairs
+        :param unseen: An array of shape (T,) with log P(word | tag) for words that the tag never emitted
+        :param entries: Further (wordIds, tagIds, logProbs) arrays to include, or None
+        :return: An EmissionTable
+        """
+        wordIds = [ids for ids, _ in tagRows.values()]
+        tagIds = [np.full(len(ids), j, dtype=np.int32) for j, (ids, _) in tagRows.items()]
+        data = [logProbs for _, logProbs in tagRows.values()]
+        if entries is not None:
+            wordIds.append(entries[0])
+            tagIds.append(entries[1])
+            data.append(entries[2])
+
+        wordIds = np.concatenate(wordIds) if wordIds else np.zeros(0, dtype=np.int64)
+        tagIds = np.concatenate(tagIds) if tagIds else np.zeros(0, dtype=np.int32)
+        data = np.concatenate(data) if data else np.zeros(0)
+
+        # sort the entries by word, and by tag within a word
+        order = np.lexsort((tagIds, wordIds))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(wordIds, minlength=len(vocabulary)))
+        return cls(vocabulary, indptr, tagIds[order].astype(np.int32), data[order], unseen)
+
+    def replaceTags(self, emissionCounts, tags, dirtyIds, smoothing):
+        """
+        Recompute the rows of some tags, and keep the entries of all other tags.
+
+        :param emissionCounts: A dictionary that maps each tag to a dictionary of the counts of the words that it emits
+        :param tags: A list of tags, where the position of a tag is its index in the table
+        :param dirtyIds: The indices of the tags whose counts changed
+        :param smoothing: A Smoothing
+        :return: A new EmissionTable, whose vocabulary extends the vocabulary of this one
+        """
+        vocabulary = list(self.vocabulary)
+        wordIndex = dict(self.wordIndex)
+        unseen = self.unseen.copy()
+        tagRows = {}
+        for j in dirtyIds:
+            tagRows[j], unseen[j] = self.tagRow(emissionCounts[tags[j]], smoothing, vocabulary, wordIndex)
+
+        entryWordIds = np.repeat(np.arange(len(self.vocabulary), dtype=np.int64), np.diff(self.indptr))
+        keep = ~np.isin(self.indices, list(dirtyIds))
+        entries = (entryWordIds[keep], self.indices[keep], self.data[keep])
+        return self.fromTagRows(vocabulary, tagRows, unseen, entries)
+
+    def column(self, word):
+        """
+        Look up log P(word | t) for every tag.
+
+        :param word: A word, after any UNK conversion
+        :return: A read-only array of shape (T,)
+        """
+        i = self.wordIndex.get(word)
+        if i is None:
+            return self.unseen
+
+        start, end = self.indptr[i], self.indptr[i + 1]
+        col = self.unseen.copy()
+        col[self.indices[start:end]] = self.data[start:end]
+        col.flags.writeable = False
+        return col
+
+
+class TagDictionary:
+    """
+    The tags that each word of the vocabulary was seen with in the training corpus, in a CSR layout that is aligned
+    with the vocabulary of an EmissionTable.
+    """
+
+    def __init__(self, indptr, indices):
+        """
+        :param indptr: An array of shape (V+1,) with the start of the row of each word in indices
+        :param indices: An array with the allowed tag indices of each word, sorted within each row
+        """
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def fromPairs(cls, emissionPairs, vocabulary, tagIndex, minCount=1):
+        """
+        Build a tag dictionary from the emission counts of a training corpus.
+
+        :param emissionPairs: A Counter of (tag, word) pairs
+        :param vocabulary: A list of words, where the position of a word is its row in the dictionary
+        :param tagIndex: A dictionary that maps each tag to its index
+        :param minCount: The minimum number of times a word must be seen with a tag to allow the tag
+        :return: A TagDictionary
+        """
+        wordIndex = {w: i for i, w in enumerate(vocabulary)}
+        rows = [[] for _ in vocabulary]
+        for (t, w), count in emissionPairs.items():
+            if count >= minCount and t in tagIndex and w in wordIndex:
+                rows[wordIndex[w]].append(tagIndex[t])
+
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(r) for r in rows])
+        indices = np.fromiter((j for r in rows for j in sorted(r)), dtype=np.int32, count=indptr[-1])
+        return cls(indptr, indices)
+
+    def candidates(self, i):
+        """
+        :param i: The index of a word in the vocabulary, or None for a word that is not in the vocabulary
+        :return: An array of the allowed tag indices, or None if every tag is allowed
+        """
+        if i is None:
+            return None
+        start, end = self.indptr[i], self.indptr[i + 1]
+        if start == end:
+            return None
+        return self.indices[start:end]
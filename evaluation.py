@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class Evaluation:
+    """
+    Accumulate the evaluation of predicted tags against gold tags, one batch of sentences at a time.
+
+    Tags are encoded as integers, and each batch is added to a confusion matrix, so the predictions of earlier batches
+    do not need to be kept.
+    """
+
+    def __init__(self, tags=(), knownWords=None):
+        """
+        :param tags: The tags of the model, which come first in the confusion matrix; other tags are added as they occur
+        :param knownWords: A collection of the words that were seen in training, or None to skip the known and unknown
+                           word accuracies
+        """
+        self.tags = []
+        self.tagIndex = {}
+        self.confusion = np.zeros((0, 0), dtype=np.int64)
+        self.knownWords = knownWords
+        # [correct, total] of the known and the unknown words
+        self.known = np.zeros(2, dtype=np.int64)
+        self.unknown = np.zeros(2, dtype=np.int64)
+        self.encode(tags)
+
+    def encode(self, tags):
+        """
+        :param tags: A list of tags
+        :return: An array with the index of each tag, where new tags are added to the confusion matrix
+        """
+        tagIndex = self.tagIndex
+        ids = np.fromiter((tagIndex.setdefault(t, len(tagIndex)) for t in tags), dtype=np.int64, count=len(tags))
+        if len(tagIndex) > len(self.tags):
+            self.tags.extend(list(tagIndex)[len(self.tags):])
+            confusion = np.zeros((len(self.tags), len(self.tags)), dtype=np.int64)
+            confusion[:len(self.confusion), :len(self.confusion)] = self.confusion
+            self.confusion = confusion
+        return ids
+
+    def add(self, goldTags, predictedTags, sentences=None):
+        """
+        Add a batch of sentences.
+
+        :param goldTags: A list of gold tag lists
+        :param predictedTags: A list of predicted tag lists, aligned with goldTags
+        :param sentences: A list of the word lists of the sentences, which are needed for the known and unknown word
+                          accuracies
+        """
+        for gold, predicted in zip(goldTags, predictedTags):
+            if len(gold) != len(predicted):
+                raise ValueError('A sentence has {} gold tags but {} predicted tags'.format(len(gold), len(predicted)))
+
+        gold = self.encode([t for s in goldTags for t in s])
+        predicted = self.encode([t for s in predictedTags for t in s])
+        numOfTags = len(self.tags)
+        self.confusion += np.bincount(gold * numOfTags + predicted,
+                                      minlength=numOfTags * numOfTags).reshape(numOfTags, numOfTags)
+
+        if self.knownWords is not None and sentences is not None:
+            correct = gold == predicted
+            known = np.fromiter((w in self.knownWords for s in sentences for w in s), dtype=bool, count=len(gold))
+            self.known += [np.count_nonzero(correct & known), np.count_nonzero(known)]
+            self.unknown += [np.count_nonzero(correct & ~known), np.count_nonzero(~known)]
+
+    def addStream(self, triples, batchSize=1000):
+        """
+        Add (sentence, goldTags, predictedTags) triples, in batches of batchSize sentences.
+
+        :param triples: An iterable of triples, i.e. from a generator that tags the sentences one at a time
+        :param batchSize: The number of sentences that are encoded at a time
+        """
+        batch = []
+        for triple in triples:
+            batch.append(triple)
+            if len(batch) == batchSize:
+                self.add([g for _, g, _ in batch], [p for _, _, p in batch], [s for s, _, _ in batch])
+                batch = []
+        if batch:
+            self.add([g for _, g, _ in batch], [p for _, _, p in batch], [s for s, _, _ in batch])
+
+    def result(self):
+        """
+        :return: A dictionary with the token accuracy, the confusion matrix, the per-tag precision, recall and F1, and
+                 the accuracies of the known and the unknown words
+        """
+        confusion = self.confusion
+        correct = np.diag(confusion)
+        total = int(confusion.sum())
+        goldCounts = confusion.sum(axis=1)
+        predictedCounts = confusion.sum(axis=0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(predictedCounts > 0, correct / predictedCounts, 0.0)
+            recall = np.where(goldCounts > 0, correct / goldCounts, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+        result = {
+            'tokens': total,
+            'correct': int(correct.sum()),
+            'accuracy': float(correct.sum() / total) if total else 0.0,
+            'tags': list(self.tags),
+            # confusion[gold, predicted]
+            'confusion': confusion.copy(),
+            'perTag': {t: {'precision': float(precision[i]), 'recall': float(recall[i]), 'f1': float(f1[i]),
+                           'support': int(goldCounts[i])}
+                       for i, t in enumerate(self.tags)},
+        }
+        if self.knownWords is not None:
+            result['knownTokens'] = int(self.known[1])
+            result['knownAccuracy'] = float(self.known[0] / self.known[1]) if self.known[1] else 0.0
+            result['unknownTokens'] = int(self.unknown[1])
+            result['unknownAccuracy'] = float(self.unknown[0] / self.unknown[1]) if self.unknown[1] else 0.0
+        return result
+
+
+def evaluate(goldTags, predictedTags, sentences=None, knownWords=None, tags=()):
+    """
+    Evaluate predicted tags against gold tags.
+
+    :param goldTags: A list of gold tag lists
+    :param predictedTags: A list of predicted tag lists, aligned with goldTags
+    :param sentences: A list of the word lists of the sentences, or None
+    :param knownWords: A collection of the words that were seen in training, or None
+    :param tags: The tags of the model, which come first in the confusion matrix
+    :return: The dictionary of Evaluation.result()
+    """
+    evaluation = Evaluation(tags, knownWords)
+    evaluation.add(goldTags, predictedTags, sentences)
+    return evaluation.result()
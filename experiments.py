@@ -0,0 +1,173 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from corpusCache import CACHE_DIR, openCorpus
+from evaluation import evaluate
+from hmm import HMM
+from otherLang import CORPORA
+from unk import HMM_UNK
+
+# bump this when a change to the models makes the cached model files stale
+MODEL_CACHE_VERSION = 1
+MODEL_CLASSES = {'HMM': HMM, 'HMM_UNK': HMM_UNK}
+# the share of every corpus that is kept for testing, whatever the train fraction is
+TEST_FRACTION = 0.05
+COLUMNS = ['corpus', 'model', 'infrequent', 'trainFraction', 'trainSents', 'testSents', 'accuracy', 'setupSeconds',
+           'decodeSeconds', 'peakRssMB', 'cachedModel']
+
+
+def modelCachePath(cell, directory):
+    """
+    :return: The path of the cached model file of an experiment cell
+    """
+    return os.path.join(directory, 'models', '{}-{}-{}-i{}-n{}-v{}.hmm'.format(
+        cell['corpus'], cell['tagset'] or 'default', cell['model'], cell['infrequent'], cell['trainSents'],
+        MODEL_CACHE_VERSION))
+
+
+def experimentCells(corpora, models, infrequents, trainFractions, directory=CACHE_DIR):
+    """
+    Expand the experiment matrix into cells.
+
+    The infrequent threshold only applies to HMM_UNK, so HMM has a single cell per corpus and train fraction. Train
+    fractions that are clamped to the same number of training sentences give the same model, so only the first of them
+    gets a cell.
+
+    :param corpora: A list of the numbers of CORPORA
+    :param models: A list of model names, i.e. ['HMM', 'HMM_UNK']
+    :param infrequents: A list of infrequent thresholds of HMM_UNK
+    :param trainFractions: A list of the shares of each corpus to train on, at most 1 - TEST_FRACTION
+    :param directory: The directory of the cache files
+    :return cells: A list of dictionaries, one for each experiment
+    """
+    cells = []
+    for number in corpora:
+        name, tagset, lang = CORPORA[number]
+        # the corpus cache is built once, before the cells of the corpus are run in parallel
+        numOfSents = len(openCorpus(name, tagset, directory).tagged_sents())
+        testSize = int(numOfSents * TEST_FRACTION)
+
+        seen = set()
+        for model, trainFraction in itertools.product(models, trainFractions):
+            trainSents = min(int(numOfSents * trainFraction), numOfSents - testSize)
+            for infrequent in (infrequents if model == 'HMM_UNK' else [None]):
+                # cells with the same model file would also train it twice, and race to write it
+                if (model, infrequent, trainSents) in seen:
+                    continue
+                seen.add((model, infrequent, trainSents))
+                cells.append({
+                    'corpus': name, 'tagset': tagset, 'lang': lang, 'model': model, 'infrequent': infrequent,
+                    'trainFraction': trainFraction, 'trainSents': trainSents, 'testSents': testSize,
+                    'directory': directory,
+                })
+    return cells
+
+
+def runCell(cell, useModelCache=True):
+    """
+    Train or load the model of an experiment cell, and tag its testing sentences.
+
+    :param cell: A dictionary from experimentCells()
+    :param useModelCache: Whether to load the trained model from the model cache, and to save it there
+    :return result: A dictionary with the accuracy, the wall times and the peak memory of the cell
+    """
+    modelClass = MODEL_CLASSES[cell['model']]
+    corpus = openCorpus(cell['corpus'], cell['tagset'], cell['directory'])
+    path = modelCachePath(cell, cell['directory'])
+
+    start = time.perf_counter()
+    cachedModel = useModelCache and os.path.exists(path)
+    if cachedModel:
+        hmm = modelClass.load(path)
+    else:
+        kwargs = {} if cell['model'] == 'HMM' else {'lang': cell['lang'], 'infrequent': cell['infrequent']}
+        hmm = modelClass(corpus, cell['tagset'], trainSize=cell['trainSents'], testSize=cell['testSents'], **kwargs)
+        hmm.setup()
+        if useModelCache:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # save() writes the file atomically, so a concurrent load never sees a partial model
+            hmm.save(path)
+    setupSeconds = time.perf_counter() - start
+
+    # the testing sentences are the ones that follow the largest training share
+    tagged = corpus.tagged_sents(tagset=cell['tagset'])
+    testSents = tagged[len(tagged) - cell['testSents']:]
+    sentences = [[w for (w, _) in s] for s in testSents]
+    start = time.perf_counter()
+    finalTags = hmm.viterbiBatch(sentences)
+    decodeSeconds = time.perf_counter() - start
+
+    evaluation = evaluate([[t for (_, t) in s] for s in testSents], finalTags)
+
+    result = {k: cell[k] for k in COLUMNS if k in cell}
+    result.update({
+        'accuracy': evaluation['accuracy'],
+        'setupSeconds': setupSeconds,
+        'decodeSeconds': decodeSeconds,
+        # each cell runs in a fresh worker process, so the peak RSS is the one of the cell
+        'peakRssMB': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'cachedModel': cachedModel,
+    })
+    return result
+
+
+def runExperiments(cells, workers=None, useModelCache=True):
+    """
+    Run the experiment cells in a pool of worker processes.
+
+    :param cells: A list of dictionaries from experimentCells()
+    :param workers: The number of worker processes, or None for the number of CPUs
+    :param useModelCache: Whether to reuse the trained models of earlier runs
+    :return results: A list of result dictionaries, in the same order as cells
+    """
+    # a fresh process for every cell keeps the peak memory of one cell apart from the others
+    with multiprocessing.Pool(workers, maxtasksperchild=1) as pool:
+        return pool.starmap(runCell, [(cell, useModelCache) for cell in cells], chunksize=1)
+
+
+def formatTable(results):
+    """
+    :return: The results as a text table, with one row for each cell
+    """
+    def cell(value):
+        if isinstance(value, float):
+            return '{:.4f}'.format(value)
+        return '-' if value is None else str(value)
+
+    rows = [COLUMNS] + [[cell(r[c]) for c in COLUMNS] for r in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(COLUMNS))]
+    return '\n'.join('  '.join(v.ljust(w) for v, w in zip(row, widths)).rstrip() for row in rows)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(prog='experiments.py',
+                                     description='Run a matrix of tagging experiments in a process pool.')
+    parser.add_argument('--corpora', type=int, nargs='+', default=sorted(CORPORA),
+                        help='the numbers of the corpora, as in otherLang.py')
+    parser.add_argument('--models', nargs='+', default=['HMM', 'HMM_UNK'], choices=sorted(MODEL_CLASSES))
+    parser.add_argument('--infrequent', type=int, nargs='+', default=[1], help='the infrequent thresholds of HMM_UNK')
+    parser.add_argument('--train', type=float, nargs='+', default=[0.95], help='the train fractions of each corpus')
+    parser.add_argument('--workers', type=int, help='the number of worker processes, by default the number of CPUs')
+    parser.add_argument('--no-model-cache', action='store_true', help='train every model, and do not save them')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='the directory of the corpus and model caches')
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    options = parser.parse_args(args)
+
+    start = time.time()
+    cells = experimentCells(options.corpora, options.models, options.infrequent, options.train, options.cache_dir)
+    results = runExperiments(cells, options.workers, not options.no_model_cache)
+    print(formatTable(results))
+    print('Total cost time = {0:.2f}'.format(time.time() - start))
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
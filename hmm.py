@@ -1,158 +1,640 @@
-import nltk
-from nltk import FreqDist, WittenBellProbDist
-from nltk.corpus import brown
-from nltk.tag.util import untag
-import operator
+import hashlib
+import json
+import numpy as np
+from collections import Counter
+from decoding import checkBeam, viterbiDecode, viterbiDecodeBatch, viterbiBeamDecode, viterbiRestrictedDecode
+from emission import EmissionTable, TagDictionary
+from cache import LRUCache, SentenceCache
+from instrumentation import Stats
+from training import countParallel, countSentences, countEncoded, countStream, EncodedSentences
+from corpusCache import openCorpus
+from evaluation import Evaluation, evaluate
+from modelFile import writeModel, readModel, encodeStrings, decodeStrings
+from smoothing import BINS, WittenBell, getSmoothing
 
 
 class HMM:
+    # the number of emission columns that are cached, keyed on the raw word
+    emissionCacheSize = 10000
+    # the minimum number of times a word must be seen with a tag in training for the tag dictionary to allow it;
+    # None disables the tag dictionary, so that every word is scored against every tag
+    tagDictionaryMinCount = None
+    # the smoothing of the transition and the emission counts, as a Smoothing or the name of one in smoothing.SMOOTHING
+    transitionSmoothing = 'wittenbell'
+    emissionSmoothing = 'wittenbell'
+    # the cache of the tags of whole sentences, which is disabled unless enableSentenceCache() is called
+    sentenceCache = None
+
     def __init__(self, corpus, tagset="", trainSize=10000, testSize=500):
-        # initialise the basic attributes
+        # initialise the basic attributes; the corpus may be None for a model that is trained with setupStream()
         self.corpus = corpus
-        self.taggedSents, self.sents = self.getSentences(tagset)
+        self.taggedSents, self.sents = self.getSentences(tagset) if corpus is not None else (None, None)
         self.trainSize = trainSize
         self.testingSize = testSize
         self.initialised = False
+        self.compiled = False
+        self.modelPath = None
+        self.statistics = Stats()
 
 
-    def setup(self):
+    def setup(self, workers=1):
         """
         Initialise the basic attributes.
-        """
-
-        # split the set of all sentences into training set and testing set
-        self.trainSents, self.testSents = self.splitTrainingTesting()
-
-        # A transit table that is used for counting occurrences of one part of speech following another in a training corpus
-        self.transitTable = {}
 
-        # split training sentences into tags and words
-        self.words, self.tags = self.splitWordsTagsTraining()
+        :param workers: The number of worker processes that count the training sentences
+        """
 
-        # count occurrences of words together with parts of speech in a training corpus
-        self.occurrenceMap_w, self.occurrenceMap_t = self.countOccurrences()
+        phase = self.statistics.phase
 
-        # create transit table
-        self.transitTable = self.createTransitTable(self.transitTable, self.occurrenceMap_t)
+        # split the set of all sentences into training set and testing set
+        with phase('splitTrainingTesting'):
+            self.trainSents, self.testSents = self.splitTrainingTesting()
+
+        if workers == 1:
+            # encode training sentences as arrays of word IDs and tag IDs
+            with phase('encodeTraining'):
+                trainingData = EncodedSentences(self.trainSents)
+
+            # count occurrences, tag transitions and emissions in a training corpus
+            with phase('countEncoded'):
+                self.occurrenceMap_w, self.occurrenceMap_t, self.emissionPairs, self.bigramPairs = \
+                    countEncoded(trainingData)
+            # only the counts are kept, so the encoded sentences are freed before the count tables are built
+            del trainingData
+        else:
+            # count shards of the training sentences in parallel, and merge the counts
+            with phase('countTrainingParallel'):
+                self.countTrainingParallel(workers)
 
         # split testing sentences into tags and words
-        self.check_sents = self.taggedSents[self.trainSize:self.trainSize + self.testingSize]
-        self.testingWords, self.testingTags = self.splitWordsTagsTesting()
+        with phase('splitWordsTagsTesting'):
+            self.check_sents = self.taggedSents[self.trainSize:self.trainSize + self.testingSize]
+            self.testingWords, self.testingTags = self.splitWordsTagsTesting()
 
         # split testing sentences into tags and words - exclude delimiters
-        self.testingWordsNoDelim, self.testingTagsNoDelim = self.splitWordsTagsTestingNoDelim()
+        with phase('splitWordsTagsTestingNoDelim'):
+            self.testingWordsNoDelim, self.testingTagsNoDelim = self.splitWordsTagsTestingNoDelim()
 
         # Get unique tags
-        self.uniqueTags, self.uniqueTagsNoDelim = self.getUniqueTags()
-        # calculate smoothed probabilities
-        self.wordsDist, self.tagsDist = self.setProbDistributions()
+        with phase('getUniqueTags'):
+            self.uniqueTags, self.uniqueTagsNoDelim = self.getUniqueTags()
+        # collect the counts that are smoothed when the model is compiled
+        with phase('setCountTables'):
+            self.setCountTables()
+        # update() continues the training corpus after its last sentence
+        self.lastTrainingSentence = self.trainSents[-1] if len(self.trainSents) > 0 else []
+        self.pendingTags = set()
         # Mark as initialised
         self.initialised = True
+        self.compiled = False
+        self.modelPath = None
+        self.statistics.emit('setup')
+
+    def setupStream(self, taggedSentences, chunkSize=1000):
+        """
+        Train on tagged sentences from an iterator, which is consumed exactly once.
+
+        Unlike setup(), neither the training sentences nor their words and tags are kept, only the count tables, so the
+        memory depends on the size of the vocabulary rather than of the corpus. The model has no testing sentences;
+        evaluate it with evaluateStream().
 
+        :param taggedSentences: An iterable of tagged sentences, i.e. corpus.tagged_sents() or a generator
+        :param chunkSize: The number of sentences that are counted at a time
+        """
+        phase = self.statistics.phase
+
+        # count occurrences, tag transitions and emissions, one chunk of sentences at a time
+        with phase('countTrainingStream'):
+            self.countTrainingStream(taggedSentences, chunkSize)
+
+        self.testingSize = 0
+        self.check_sents = []
+        self.testingWords, self.testingTags = [], []
+        self.testingWordsNoDelim, self.testingTagsNoDelim = [], []
+
+        with phase('getUniqueTags'):
+            self.uniqueTags, self.uniqueTagsNoDelim = self.getUniqueTags()
+        with phase('setCountTables'):
+            self.setCountTables()
+        self.pendingTags = set()
+        self.initialised = True
+        self.compiled = False
+        self.modelPath = None
+        self.statistics.emit('setup')
 
-    def viterbi(self, targetSentences:list=None):
+    def viterbi(self, targetSentences:list=None, beamWidth=None, beamThreshold=None):
         """
         Viterbi Algorithm
+
+        :param targetSentences: A list of sentences, where each sentence is a list of words
+        :param beamWidth: Keep only the best beamWidth states at each position, or None for exact decoding
+        :param beamThreshold: Keep only the states within this log probability of the best one, or None
+        :return finalTags: A list of tag lists
         """
+        checkBeam(beamWidth, beamThreshold)
         print('Start viterbi algorithm')
-        finalTags=[]
-        probMatrix = []
-        distOfStartOfSentence = self.tagsDist['<s>']
 
         # check if the targetSentences is None
         if targetSentences is None:
             targetSentences = self.testingWordsNoDelim  # If None, use the testing sentences
 
-        # use for loop to iterate targetSentences
-        for s in targetSentences:
-            firstRun = True
-            for word in s:
-                col = []
-                for t in self.uniqueTagsNoDelim:
+        finalTags = [tags for _, tags in self.tag_stream(targetSentences, beamWidth, beamThreshold)]
+        if self.statistics.enabled:
+            self.statistics.emit('viterbi', self.stats())
+
+        print('Finish viterbi algorithm')
+
+        return finalTags
+
+    def compile(self):
+        """
+        Smooth the counts into log space arrays that are used by the Viterbi decoder.
+        """
+        with self.statistics.phase('compile'):
+            # only the rows of the tags whose counts were updated are smoothed again
+            pendingTags = self.pendingTags
+            self.pendingTags = set()
+            if pendingTags and self.compiledTags == self.uniqueTagsNoDelim:
+                self.refreshCompiled(pendingTags)
+            else:
+                self.compileAll()
+        self.finishCompile()
 
-                    # check if this is the first run
-                    if firstRun:
-                        pT = distOfStartOfSentence.prob(t)  # use the distribution value of 'start-of-sentence' as tag probability
-                        pW = self.wordsDist[t].prob(word)   # calculate the probability value for the current word with given tag
-                        col.append([pW*pT, "q0"])
+    def finishCompile(self):
+        """
+        Mark the model as compiled, once all of its arrays are built.
 
-                    else:
-                        tagMap = {}
-                        for pp in range(0, len(self.uniqueTagsNoDelim)):
-                            # P(t(i) | t(i-1))
-                            pT = self.tagsDist[self.uniqueTagsNoDelim[pp]].prob(t)
-                            # P(w(i) | t(i))
-                            pW = self.wordsDist[t].prob(word)
+        Subclasses that compile more arrays on top of the smoothed counts build them here, before calling this method,
+        so the fingerprint of the sentence cache is taken from the whole compiled model.
+        """
+        self.emissionCache = LRUCache(self.emissionCacheSize)
+        self.compiled = True
+        if self.sentenceCache is not None:
+            self.sentenceCache.setFingerprint(self.modelFingerprint())
 
-                            tagMap[self.uniqueTagsNoDelim[pp]] = pT * pW * probMatrix[-1][pp][0]
+    def compileAll(self):
+        """
+        Smooth and compile the counts of all tags.
+        """
+        self.tagIndex = {t: i for i, t in enumerate(self.uniqueTagsNoDelim)}
+        self.compiledTags = list(self.uniqueTagsNoDelim)
+
+        # log P(t | <s>), and log P(cur | prev) indexed as [prev, cur]
+        logProbs = self.transitionLogProbs(['<s>'] + self.uniqueTagsNoDelim)
+        self.logStart = logProbs[0].copy()
+        self.logTransition = logProbs[1:].copy()
+        # log P(word | t)
+        self.emissions = EmissionTable.fromCounts(self.emissionCounts, self.uniqueTagsNoDelim,
+                                                  getSmoothing(self.emissionSmoothing))
+        # the tags that each word may take
+        self.tagDictionary = None
+        if self.tagDictionaryMinCount is not None:
+            self.tagDictionary = TagDictionary.fromPairs(self.emissionPairs, self.emissions.vocabulary,
+                                                         self.tagIndex, self.tagDictionaryMinCount)
+
+    def refreshCompiled(self, tags):
+        """
+        Recompile the rows of the given tags, and keep the compiled rows of all other tags.
 
-                        prevBestTag = max(tagMap.items(), key=operator.itemgetter(1))[0]
-                        value = max(tagMap.items(), key=operator.itemgetter(1))[1]
+        :param tags: The tags whose counts changed
+        """
+        dirtyIds = [self.tagIndex[t] for t in tags if t in self.tagIndex]
+
+        if '<s>' in tags:
+            self.logStart = self.transitionLogProbs(['<s>'])[0]
+        if dirtyIds:
+            self.logTransition[dirtyIds] = self.transitionLogProbs([self.uniqueTagsNoDelim[j] for j in dirtyIds])
+            self.emissions = self.emissions.replaceTags(self.emissionCounts, self.uniqueTagsNoDelim, dirtyIds,
+                                                        getSmoothing(self.emissionSmoothing))
+        if self.tagDictionaryMinCount is not None:
+            self.tagDictionary = TagDictionary.fromPairs(self.emissionPairs, self.emissions.vocabulary,
+                                                         self.tagIndex, self.tagDictionaryMinCount)
+
+    def enableStats(self, sink=None):
+        """
+        Record the wall time and the allocation delta of each phase of setup(), and the counters of decoding.
 
-                        col.append([value, prevBestTag])
-                firstRun = False
-                probMatrix.append(col)
+        :param sink: None, the path of a file that the statistics are appended to as JSON lines, or a logger
+        """
+        self.statistics = Stats(enabled=True, sink=sink)
 
-            finalTags.append(self.getTagsFromMatrix(probMatrix, s))
+    def enableSentenceCache(self, maxsize=10000, spillPath=None):
+        """
+        Cache the tags of whole sentences, so that repeated sentences are not decoded again.
 
-        print('Finish viterbi algorithm')
+        The cache sits in front of decodeSentence(), tag_stream(), viterbiBatch() and viterbiParallel(). Its entries
+        belong to the compiled model with the same fingerprint, so the cache is dropped when the model is recompiled
+        after update().
 
-        return finalTags
+        :param maxsize: The maximum number of sentences in memory
+        :param spillPath: The path of a dbm file that the sentences evicted from memory are written to, or None
+        :return: The SentenceCache
+        """
+        self.sentenceCache = SentenceCache(maxsize, spillPath)
+        if self.compiled:
+            self.sentenceCache.setFingerprint(self.modelFingerprint())
+        return self.sentenceCache
 
-    def getSentences(self, selected_tagset):
-        tagged_sents = self.corpus.tagged_sents(tagset=selected_tagset)
-        sents = self.corpus.sents()
-        return tagged_sents, sents
+    def modelFingerprint(self):
+        """
+        :return: A hash of the compiled model, which is the same for a model and the model file it was saved to
+        """
+        header = dict(self.modelMetadata(), model=type(self).__name__, tags=self.uniqueTagsNoDelim)
+        digest = hashlib.blake2b(json.dumps(header, sort_keys=True).encode('utf-8'), digest_size=16)
+        for name, array in sorted(self.modelArrays().items()):
+            digest.update(name.encode('utf-8'))
+            digest.update(np.ascontiguousarray(array).data)
+        return digest.hexdigest()
+
+    def stats(self):
+        """
+        :return: A dictionary with the recorded phases and counters, and the counters of the emission cache and of the
+                 sentence cache
+        """
+        stats = self.statistics.asDict()
+        if self.compiled:
+            stats['emissionCache'] = self.emissionCache.stats()
+        if self.sentenceCache is not None:
+            stats['sentenceCache'] = self.sentenceCache.stats()
+        return stats
+
+    def save(self, path):
+        """
+        Save the compiled model to a memory-mappable model file.
+
+        :param path: The path of the model file
+        """
+        if not self.compiled:
+            self.compile()
+        header = dict(self.modelMetadata(), model=type(self).__name__, tags=self.uniqueTagsNoDelim)
+        writeModel(path, header, self.modelArrays())
+        self.modelPath = path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a compiled model from a model file that was written by save().
 
-    def countOccurrences(self):
+        The model is ready for decoding straight away, without a corpus or any training.
+
+        :param path: The path of the model file
+        :return: A compiled instance of this class
+        """
+        header, arrays = readModel(path)
+        if header['model'] != cls.__name__:
+            raise ValueError('{} contains a {} model, not {}'.format(path, header['model'], cls.__name__))
+
+        hmm = cls.__new__(cls)
+        hmm.statistics = Stats()
+        hmm.restoreModel(header, arrays)
+        hmm.initialised = True
+        hmm.compiled = True
+        hmm.modelPath = path
+        return hmm
+
+    def modelMetadata(self):
+        """
+        :return: A dictionary of the settings that are needed to decode with a saved model
         """
-        Count the occurrences of words together with parts of speech in a training corpus.
+        return {}
 
-        :return occurrenceMap_w: A dictionary for the occurrences of words
-        :return occurrenceMap_t: A dictionary for the occurrences of tags
+    def modelArrays(self):
+        """
+        :return: A dictionary of the compiled arrays that are needed to decode with a saved model
+        """
+        vocabBlob, vocabOffsets = encodeStrings(self.emissions.vocabulary)
+        arrays = {
+            'logStart': self.logStart,
+            'logTransition': self.logTransition,
+            'vocabBlob': vocabBlob,
+            'vocabOffsets': vocabOffsets,
+            'emissionIndptr': self.emissions.indptr,
+            'emissionIndices': self.emissions.indices,
+            'emissionData': self.emissions.data,
+            'emissionUnseen': self.emissions.unseen,
+        }
+        if self.tagDictionary is not None:
+            arrays['tagDictionaryIndptr'] = self.tagDictionary.indptr
+            arrays['tagDictionaryIndices'] = self.tagDictionary.indices
+        return arrays
+
+    def restoreModel(self, header, arrays):
         """
-        wordList = self.words
-        tagList = self.tags
+        Restore the compiled model from the contents of a model file.
 
-        def countOccurrencesForGivenList(targetList):
-            """
-            Count the occurrences of elements in the given list.
+        :param header: The header of the model file
+        :param arrays: The arrays of the model file
+        """
+        self.uniqueTagsNoDelim = header['tags']
+        self.tagIndex = {t: i for i, t in enumerate(self.uniqueTagsNoDelim)}
+        self.compiledTags = list(self.uniqueTagsNoDelim)
+        # the counts are not saved, so a loaded model cannot be updated
+        self.emissionCounts = None
+        self.pendingTags = set()
+        self.logStart = arrays['logStart']
+        self.logTransition = arrays['logTransition']
+        vocabulary = decodeStrings(arrays['vocabBlob'], arrays['vocabOffsets'])
+        self.emissions = EmissionTable(vocabulary, arrays['emissionIndptr'], arrays['emissionIndices'],
+                                       arrays['emissionData'], arrays['emissionUnseen'])
+        self.tagDictionary = None
+        if 'tagDictionaryIndptr' in arrays:
+            self.tagDictionary = TagDictionary(arrays['tagDictionaryIndptr'], arrays['tagDictionaryIndices'])
+        self.emissionCache = LRUCache(self.emissionCacheSize)
+
+    def convertWord(self, word):
+        """
+        Convert the given word to the form that is looked up in the emission distributions.
 
-            :return targetMap: A dictionary for the calculated occurrences.
-            """
-            targetMap = {}
-            for e in targetList:
-                if targetMap.get(e) is None:
-                    targetMap[e] = 1
-                else:
-                    targetMap[e] = targetMap[e] + 1
+        :param word: A word of the target sentence
+        :return: The word to look up
+        """
+        return word
 
-            return targetMap
+    def resolveWord(self, word):
+        """
+        Look up the emission column of a word, and the tags that the tag dictionary allows for it.
 
-        occurrenceMap_w = countOccurrencesForGivenList(wordList)
-        occurrenceMap_t = countOccurrencesForGivenList(tagList)
+        The results are cached on the raw word, so a repeated word skips both the UNK conversion and the lookups. The
+        UNK tag that replaced the word is cached with them, so with statistics enabled every token is counted by it.
 
-        return occurrenceMap_w, occurrenceMap_t
+        :param word: A word of the target sentence
+        :return column: A read-only array of shape (T,) with log P(word | t) for every tag
+        :return candidates: An array of the allowed tag indices, or None if every tag is allowed
+        :return unkTag: The UNK tag that was looked up instead of the word, or None
+        """
+        entry = self.emissionCache.get(word)
+        if entry is None:
+            lookupWord = self.convertWord(word)
+            candidates = None
+            if self.tagDictionary is not None:
+                candidates = self.tagDictionary.candidates(self.emissions.wordIndex.get(lookupWord))
+            entry = (self.emissions.column(lookupWord), candidates, lookupWord if lookupWord != word else None)
+            self.emissionCache.put(word, entry)
+        if self.statistics.enabled:
+            self.statistics.count('emissionLookups')
+            if entry[2] is not None:
+                self.statistics.unkSubstitutions[entry[2]] += 1
+        return entry
+
+    def maskEmissions(self, logEmissions, candidates):
+        """
+        Rule out the tags that the tag dictionary does not allow.
 
-    def countPrevTagToCurTag(self, sentence):
+        :param logEmissions: An array of shape (n, T)
+        :param candidates: A list of n arrays with the allowed tag indices of each word
+        :return: A copy of logEmissions, where every other tag has a log probability of -inf
         """
-        Count occurrences of one part of speech following another in a training corpus.
+        masked = np.full_like(logEmissions, -np.inf)
+        for i, c in enumerate(candidates):
+            masked[i, c] = logEmissions[i, c]
+        return masked
+
+    def decodeSentence(self, sentence, beamWidth=None, beamThreshold=None):
         """
-        curTag = '<s>'
+        Tag a single sentence with the compiled model, or take its tags from the sentence cache.
 
-        for (_, t) in sentence:
-            prevTag = curTag
-            curTag = t
+        :param sentence: A list of words
+        :param beamWidth: Keep only the best beamWidth states at each position, or None for exact decoding
+        :param beamThreshold: Keep only the states within this log probability of the best one, or None
+        :return: A list of tags
+        """
+        checkBeam(beamWidth, beamThreshold)
+        if not self.compiled:
+            self.compile()
+
+        cache = self.sentenceCache
+        if cache is None:
+            return self.decodeUncached(sentence, beamWidth, beamThreshold)
+
+        key = cache.key(sentence, beamWidth, beamThreshold)
+        tags = cache.get(key)
+        if tags is None:
+            tags = self.decodeUncached(sentence, beamWidth, beamThreshold)
+            cache.put(key, tags)
+        return list(tags)
+
+    def decodeUncached(self, sentence, beamWidth=None, beamThreshold=None):
+        """
+        Tag a single sentence with the compiled model, without the sentence cache.
+        """
+        if self.statistics.enabled:
+            self.statistics.count('sentences')
+            self.statistics.count('tokens', len(sentence))
+        if len(sentence) == 0:
+            return []
+        resolved = [self.resolveWord(w) for w in sentence]
+        logEmissions = np.array([column for column, _, _ in resolved])
+
+        if self.tagDictionary is None:
+            candidates = None
+        else:
+            allTags = np.arange(len(self.uniqueTagsNoDelim))
+            candidates = [allTags if c is None else c for _, c, _ in resolved]
+            if self.statistics.enabled:
+                self.statistics.count('candidateStates', sum(len(c) for c in candidates))
+
+        path = self.decodePath(logEmissions, candidates, beamWidth, beamThreshold)
+        return [self.uniqueTagsNoDelim[i] for i in path]
+
+    def decodePath(self, logEmissions, candidates, beamWidth=None, beamThreshold=None):
+        """
+        Find the most likely tag indices of a sentence.
 
-            # check if given sequence of tags is in the transitTable
-            if prevTag not in self.transitTable:
-                self.transitTable[prevTag] = {}
-                self.transitTable[prevTag][curTag] = 1
-            elif curTag not in self.transitTable[prevTag]:
-                self.transitTable[prevTag][curTag] = 1
+        :param logEmissions: An array of shape (n, T) with log P(word_i | t) for each word of the sentence
+        :param candidates: A list of n arrays with the allowed tag indices of each word, or None if all are allowed
+        :param beamWidth: Keep only the best beamWidth states at each position, or None for exact decoding
+        :param beamThreshold: Keep only the states within this log probability of the best one, or None
+        :return path: A list of n tag indices
+        """
+        if beamWidth is None and beamThreshold is None:
+            if candidates is None:
+                path = viterbiDecode(self.logStart, self.logTransition, logEmissions)
             else:
-                self.transitTable[prevTag][curTag] += 1
+                path = viterbiRestrictedDecode(self.logStart, self.logTransition, logEmissions, candidates)
+        else:
+            if candidates is not None:
+                logEmissions = self.maskEmissions(logEmissions, candidates)
+            path = viterbiBeamDecode(self.logStart, self.logTransition, logEmissions, beamWidth, beamThreshold)
+        return path
+
+    def tag_stream(self, sentences, beamWidth=None, beamThreshold=None):
+        """
+        Tag the sentences one at a time.
+
+        Nothing is kept between sentences, so the working memory is bounded by the longest sentence and any iterable
+        can be tagged, i.e. a file that is read line by line.
+
+        :param sentences: An iterable of sentences, where each sentence is a list of words
+        :param beamWidth: Keep only the best beamWidth states at each position, or None for exact decoding
+        :param beamThreshold: Keep only the states within this log probability of the best one, or None
+        :return: A generator of (sentence, tags) pairs
+        """
+        if not self.compiled:
+            self.compile()
+
+        for s in sentences:
+            yield s, self.decodeSentence(s, beamWidth, beamThreshold)
+
+    def beamAgreement(self, targetSentences:list=None, beamWidth=None, beamThreshold=None):
+        """
+        Compare beam decoding with exact decoding.
 
+        :param targetSentences: A list of sentences, where each sentence is a list of words
+        :param beamWidth: The beam width to evaluate
+        :param beamThreshold: The beam threshold to evaluate
+        :return: A dictionary with the number and the rate of sentences and tokens whose tags differ
+        """
+        # check if the targetSentences is None
+        if targetSentences is None:
+            targetSentences = self.testingWordsNoDelim  # If None, use the testing sentences
+
+        sentences = tokens = differentSentences = differentTokens = 0
+        for s, exactTags in self.tag_stream(targetSentences):
+            beamTags = self.decodeSentence(s, beamWidth, beamThreshold)
+            different = sum(1 for a, b in zip(exactTags, beamTags) if a != b)
+            sentences += 1
+            tokens += len(s)
+            differentSentences += different > 0
+            differentTokens += different
+
+        return {
+            'sentences': sentences,
+            'differentSentences': differentSentences,
+            'sentenceDifferenceRate': differentSentences / sentences if sentences else 0.0,
+            'tokens': tokens,
+            'differentTokens': differentTokens,
+            'tokenDifferenceRate': differentTokens / tokens if tokens else 0.0,
+        }
+
+    def viterbiParallel(self, targetSentences:list=None, workers=None, chunkSize=256):
+        """
+        Viterbi Algorithm over a pool of worker processes.
+
+        :param targetSentences: A list of sentences, where each sentence is a list of words
+        :param workers: The number of worker processes, or None for the number of CPUs
+        :param chunkSize: The number of sentences that are sent to a worker at a time, and decoded there as one batch
+        :return finalTags: A list of tag lists, in the same order as targetSentences
+        """
+        # check if the targetSentences is None
+        if targetSentences is None:
+            targetSentences = self.testingWordsNoDelim  # If None, use the testing sentences
+
+        if not self.compiled:
+            self.compile()
+
+        # multiprocessing is only imported when it is used, to keep the import of a decoding-only model fast
+        from parallel import viterbiParallel
+        # the sentence cache is only used in this process; the workers decode the sentences that are not cached
+        return self.decodeCached(targetSentences,
+                                 lambda sentences: viterbiParallel(self, sentences, workers, chunkSize))
+
+    def viterbiBatch(self, targetSentences:list=None, batchSize=256):
+        """
+        Viterbi Algorithm over batches of sentences.
+
+        Sentences are sorted by length and grouped into padded buckets of at most batchSize sentences,
+        so that each time step of the recurrence is computed for a whole bucket at once.
+
+        :param targetSentences: A list of sentences, where each sentence is a list of words
+        :param batchSize: The maximum number of sentences in a bucket
+        :return finalTags: A list of tag lists, in the same order as targetSentences
+        """
+        # check if the targetSentences is None
+        if targetSentences is None:
+            targetSentences = self.testingWordsNoDelim  # If None, use the testing sentences
+
+        if not self.compiled:
+            self.compile()
+
+        finalTags = self.decodeCached(targetSentences, lambda sentences: self.decodeBatch(sentences, batchSize))
+        if self.statistics.enabled:
+            self.statistics.emit('viterbiBatch', self.stats())
+
+        return finalTags
+
+    def decodeBatch(self, sentences, batchSize=256):
+        """
+        Tag sentences in buckets of similar length.
+
+        :param sentences: A list of sentences, where each sentence is a list of words
+        :param batchSize: The maximum number of sentences in a bucket
+        :return finalTags: A list of tag lists, in the same order as sentences
+        """
+        finalTags = [None] * len(sentences)
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+
+        for start in range(0, len(order), batchSize):
+            bucket = order[start:start + batchSize]
+            for i, tags in zip(bucket, self.decodeBucket([sentences[i] for i in bucket])):
+                finalTags[i] = tags
+        return finalTags
+
+    def decodeCached(self, sentences, decode):
+        """
+        Tag sentences through the sentence cache, if it is enabled.
+
+        The cached sentences are looked up, and only the distinct sentences that are not cached are decoded; the
+        duplicates of a decoded sentence within the same call take its tags.
+
+        :param sentences: A list of sentences, where each sentence is a list of words
+        :param decode: A function that tags a list of sentences, and returns a list of tag lists
+        :return finalTags: A list of tag lists, in the same order as sentences
+        """
+        cache = self.sentenceCache
+        if cache is None:
+            return decode(sentences)
+
+        finalTags = [None] * len(sentences)
+        pending = {}
+        for i, s in enumerate(sentences):
+            key = cache.key(s)
+            if key in pending:
+                pending[key].append(i)
+                cache.batchDuplicates += 1
+                continue
+            tags = cache.get(key)
+            if tags is None:
+                pending[key] = [i]
+            else:
+                finalTags[i] = list(tags)
+
+        keys = list(pending)
+        if not keys:
+            return finalTags
+        for key, tags in zip(keys, decode([sentences[pending[key][0]] for key in keys])):
+            cache.put(key, tags)
+            for i in pending[key]:
+                finalTags[i] = list(tags)
+        return finalTags
+
+    def decodeBucket(self, sentences):
+        """
+        Tag a bucket of sentences with the compiled model.
+
+        :param sentences: A list of sentences, where each sentence is a list of words
+        :return: A list of tag lists
+        """
+        lengths = [len(s) for s in sentences]
+        if self.statistics.enabled:
+            self.statistics.count('sentences', len(sentences))
+            self.statistics.count('tokens', sum(lengths))
+        logEmissions = np.zeros((len(sentences), max(lengths), len(self.uniqueTagsNoDelim)))
+        for b, s in enumerate(sentences):
+            for i, word in enumerate(s):
+                column, candidates, _ = self.resolveWord(word)
+                logEmissions[b, i] = column
+                if candidates is not None:
+                    # the tags that the tag dictionary does not allow are ruled out
+                    logEmissions[b, i] = -np.inf
+                    logEmissions[b, i, candidates] = column[candidates]
+
+        paths = viterbiDecodeBatch(self.logStart, self.logTransition, logEmissions, lengths)
+        return [[self.uniqueTagsNoDelim[i] for i in path] for path in paths]
+
+    def getSentences(self, selected_tagset):
+        tagged_sents = self.corpus.tagged_sents(tagset=selected_tagset)
+        sents = self.corpus.sents()
+        return tagged_sents, sents
 
     def splitTrainingTesting(self):
         """
@@ -165,7 +647,7 @@ class HMM:
         test_sents = self.sents[self.trainSize:self.trainSize + self.testingSize]
         return train_sents, test_sents
 
-    def splitIntoWordsAndTags(self, sentences, isTraining=False):
+    def splitIntoWordsAndTags(self, sentences):
         """
         This method splits the sentences into words and tags.
 
@@ -179,42 +661,11 @@ class HMM:
         endDelimeter = ["</s>"]
 
         for s in sentences:
-            if isTraining:
-                self.countPrevTagToCurTag(s) # count occurrences of one part of speech following another in a training corpus
-
             words += startDelimeter + [w for (w, _) in s] + endDelimeter
             tags += startDelimeter + [t for (_, t) in s] + endDelimeter
         return words, tags
 
 
-    def createTransitTable(self, transit_table, tags_counter):
-        """
-        Create transit table with Laplace smoothing.
-
-        :param transit_table: A transit table that contains the occurrences of one part of speech following another in a training corpus.
-        :param tags_counter: A list of occurrences of part of speech in a training corpus.
-        """
-        # One less because a start of sentence <S> is excluded
-        total_tags = len(transit_table) - 1
-
-        for i in transit_table:
-            for j in transit_table:
-                if j != '<s>':
-                    if j not in transit_table[i]:
-                        transit_table[i][j] = 0  # fill empty cells with zero value
-                    else:
-                        # apply Laplace smoothing
-                        transit_table[i][j] = (transit_table[i][j] + 1.0) / (tags_counter[i] + total_tags)
-        return transit_table
-
-    def splitWordsTagsTraining(self):
-        """
-        Splitting the training sentences into words and tags.
-
-        :return: Returns a list of words and a list of tags, which are returned by the splitToWordsByTags() method
-        """
-        return self.splitIntoWordsAndTags(self.trainSents, True)
-
     def splitWordsTagsTesting(self):
         """
         Splitting the testing sentences into words and tags.
@@ -229,7 +680,7 @@ class HMM:
 
         for s in self.check_sents:
             # untag the sentence, and append it to the list of sentences
-            sentences.append(untag(s))
+            sentences.append([w for (w, _) in s])
             tags.append([t for (_, t) in s]) # add all tags in a sentence to a list of tags
         return sentences, tags
 
@@ -241,90 +692,192 @@ class HMM:
         :return uniqueTagList: A list of unique tags - include delimiters
         :return uniqueTagList_noDelim: A list of unique tags - exclude delimiters
         """
-        uniqueTagList = list(set(self.tags))
+        uniqueTagList = list(self.occurrenceMap_t)
         uniqueTagList_noDelim = uniqueTagList.copy()
         uniqueTagList_noDelim.remove('<s>')
         uniqueTagList_noDelim.remove('</s>')
         return uniqueTagList, uniqueTagList_noDelim
 
-    def setProbDistributions(self):
-        tag_dist = {}
-        word_dist = {}
-
-        for t in self.uniqueTags:
-            tagList = []
-            lenOfTags = len(self.tags)
-            wordList = []
-            for i in range(lenOfTags - 1):
-                if self.tags[i] == t:
-                    wordList.append(self.words[i])
-                    if i < (lenOfTags - 2):
-                        tagList.append(self.tags[i+1])
-            tag_dist[t] = WittenBellProbDist(FreqDist(tagList), bins=1e5)
-            word_dist[t] = WittenBellProbDist(FreqDist(wordList), bins=1e5)
-
-        return word_dist, tag_dist
-
-    def getTagsFromMatrix(self, matrix, s):
-        finalTags = []
-        pointer = ""
-
-        for i in range(1, len(s)+1):
-            maxVal = 0
-            maxID = 0
-            if i == 1:
-                for j in range(0, len(self.uniqueTagsNoDelim)):
-
-                    if matrix[-i][j][0] > maxVal:
-                        maxVal = matrix[-i][j][0]
-                        maxID = j
-                finalTags.append(self.uniqueTagsNoDelim[maxID])
-                pointer = matrix[-i][maxID][1]
+    def countTrainingParallel(self, workers):
+        """
+        Count the training sentences in shards over a pool of worker processes, and merge the counts.
 
-            else:
-                pointerID = self.uniqueTagsNoDelim.index(pointer)
-                finalTags.append(self.uniqueTagsNoDelim[pointerID])
-                pointer = matrix[-i][pointerID][1]
+        :param workers: The number of worker processes
+        """
+        self.occurrenceMap_w, self.occurrenceMap_t, self.emissionPairs, self.bigramPairs = \
+            countParallel(self.trainSents, workers)
 
-        finalTags.reverse()
+    def countTrainingStream(self, taggedSentences, chunkSize):
+        """
+        Count tagged sentences from an iterator in a single pass.
 
-        return finalTags
+        The training sentences are not kept, so update() continues after the last sentence of the stream.
+
+        :param taggedSentences: An iterable of tagged sentences
+        :param chunkSize: The number of sentences that are counted at a time
+        """
+        counts, self.trainSize, self.lastTrainingSentence = countStream(taggedSentences, chunkSize)
+        if self.trainSize == 0:
+            raise ValueError('setupStream() needs at least one tagged sentence')
+        self.occurrenceMap_w, self.occurrenceMap_t, self.emissionPairs, self.bigramPairs = counts
+
+    def setCountTables(self):
+        """
+        Group the emission and the transition counts by tag, which is how they are smoothed, and how update() adds
+        to them.
+        """
+        self.emissionCounts = {t: Counter() for t in self.uniqueTags}
+        self.transitionCounts = {t: Counter() for t in self.uniqueTags}
+
+        for (t, w), count in self.emissionPairs.items():
+            self.emissionCounts[t][w] = count
+        for (prevTag, curTag), count in self.bigramPairs.items():
+            self.transitionCounts[prevTag][curTag] = count
+
+    def transitionLogProbs(self, prevTags):
+        """
+        Smooth the transition counts of some tags, as a dense matrix over all tags.
+
+        :param prevTags: A list of tags
+        :return: An array of shape (len(prevTags), T) with log P(cur | prev), aligned with self.uniqueTagsNoDelim
+        """
+        columns = {t: i for i, t in enumerate(self.uniqueTags)}
+        counts = np.zeros((len(prevTags), len(columns)))
+        for i, prev in enumerate(prevTags):
+            row = self.transitionCounts[prev]
+            counts[i, [columns[t] for t in row]] = list(row.values())
+
+        # Witten-Bell keeps the bins of NLTK's WittenBellProbDist, the other methods share the mass between the tags
+        bins = BINS if self.transitionSmoothing == WittenBell.name else counts.shape[1]
+        logProbs = getSmoothing(self.transitionSmoothing, bins).denseLogProbs(counts)
+        return logProbs[:, [columns[t] for t in self.uniqueTagsNoDelim]]
+
+    def update(self, tagged_sentences):
+        """
+        Add tagged sentences to the training data without a full retrain.
+
+        The new sentences are counted and added to the persistent count tables. The compiled rows of the tags whose
+        counts changed are smoothed again lazily, on the next compile() or decode.
+
+        :param tagged_sentences: An iterable of tagged sentences, which follow the training sentences
+        """
+        if self.emissionCounts is None:
+            raise ValueError('update() needs the count tables of a model that was trained with setup()')
+        tagged_sentences = list(tagged_sentences)
+        if len(tagged_sentences) == 0:
+            return
+
+        occurrences_w, occurrences_t, emissionDelta, bigramDelta = countSentences(tagged_sentences)
+
+        # the last sentence so far is now followed by the new ones, and the new last sentence closes the corpus
+        previousLastTag = self.lastTrainingSentence[-1][1] if len(self.lastTrainingSentence) > 0 else '<s>'
+        newLastTag = tagged_sentences[-1][-1][1] if len(tagged_sentences[-1]) > 0 else '<s>'
+        bigramDelta[(previousLastTag, '</s>')] += 1
+        bigramDelta[(newLastTag, '</s>')] -= 1
+        self.lastTrainingSentence = tagged_sentences[-1]
+
+        previousCounts = {w: self.occurrenceMap_w.get(w, 0) for w in occurrences_w}
+        for w, count in occurrences_w.items():
+            self.occurrenceMap_w[w] = self.occurrenceMap_w.get(w, 0) + count
+        newTags = [t for t in occurrences_t if t not in self.occurrenceMap_t]
+        for t, count in occurrences_t.items():
+            self.occurrenceMap_t[t] = self.occurrenceMap_t.get(t, 0) + count
+
+        if newTags:
+            self.uniqueTags, self.uniqueTagsNoDelim = self.getUniqueTags()
+            for t in newTags:
+                self.emissionCounts[t] = Counter()
+                self.transitionCounts[t] = Counter()
+                self.pendingTags.add(t)
+
+        self.applyEmissionDelta(emissionDelta, previousCounts)
+        for (prevTag, curTag), count in bigramDelta.items():
+            addCount(self.bigramPairs, (prevTag, curTag), count)
+            addCount(self.transitionCounts[prevTag], curTag, count)
+            self.pendingTags.add(prevTag)
+
+        self.compiled = False
+        # the saved model file no longer matches, so viterbiParallel() must not hand it to its workers
+        self.modelPath = None
+
+    def applyEmissionDelta(self, emissionDelta, previousCounts):
+        """
+        Add emission counts of new training sentences to the count tables.
+
+        :param emissionDelta: A Counter of (tag, word) pairs to add
+        :param previousCounts: A dictionary with the occurrences of the words of the new sentences before the update
+        """
+        for (t, w), count in emissionDelta.items():
+            addCount(self.emissionPairs, (t, w), count)
+            addCount(self.emissionCounts[t], w, count)
+            self.pendingTags.add(t)
 
     def getAccuracy(self):
-        correct = 0
-        total = 0
-        for s in range(0, len(self.testingTagsNoDelim)):
-            for t in range(0, len(self.testingTagsNoDelim[s])):
-                if self.testingTagsNoDelim[s][t] == self.finalTags[s][t]:
-                    correct = correct+1
-                total = total + 1
+        """
+        Evaluate the tags of the testing sentences in self.finalTags, and print the accuracy.
 
-        percent = (correct / total) * 100
+        :return: The dictionary of Evaluation.result(), with the confusion matrix, the per-tag metrics and the
+                 accuracies of the known and the unknown words
+        """
+        result = evaluate(self.testingTagsNoDelim, self.finalTags, self.testingWordsNoDelim,
+                          knownWords=self.occurrenceMap_w, tags=self.uniqueTagsNoDelim)
+        percent = result['accuracy'] * 100
 
         print("Training Data: " + str(self.trainSize) + " Sentences")
         print("Testing Data: " + str(self.testingSize) + " Sentences")
         print("Accuracy {}%".format(percent))
+        return result
 
-    def viterbi_test(self):
+    def evaluateStream(self, taggedSentences, batchSize=1000):
+        """
+        Tag and evaluate tagged sentences one at a time, so that neither the sentences nor the predictions need to be
+        kept in memory.
+
+        :param taggedSentences: An iterable of tagged sentences, i.e. a lazy corpus view
+        :param batchSize: The number of sentences that are evaluated at a time
+        :return: The dictionary of Evaluation.result()
+        """
+        evaluation = Evaluation(self.uniqueTagsNoDelim, getattr(self, 'occurrenceMap_w', None))
+        goldTags = []
+
+        def sentences():
+            for s in taggedSentences:
+                goldTags.append([t for (_, t) in s])
+                yield [w for (w, _) in s]
+
+        evaluation.addStream(((s, goldTags.pop(0), tags) for s, tags in self.tag_stream(sentences())), batchSize)
+        return evaluation.result()
+
+    def viterbi_test(self, workers=1):
         if not self.initialised:
             self.setup()
-        self.finalTags = self.viterbi()
-        self.getAccuracy()
+        if workers == 1:
+            self.finalTags = self.viterbi()
+        else:
+            self.finalTags = self.viterbiParallel(workers=workers)
+        return self.getAccuracy()
+
 
+def addCount(counts, key, n):
+    """
+    Add n to a count, and remove the key if the count drops to zero.
 
+    :param counts: A Counter
+    """
+    count = counts.get(key, 0) + n
+    if count == 0:
+        counts.pop(key, None)
+    else:
+        counts[key] = count
 
-def downloadCorpus():
-    nltk.download('brown')
-    nltk.download('universal_tagset')
 
 def main():
     # create HMM instance, and run the Viterbi test
-    corpus = brown
     tagset = "universal"
+    corpus = openCorpus('brown', tagset)  # the corpus is downloaded and cached on the first run
     hmm = HMM(corpus, tagset)
     hmm.setup()
     hmm.viterbi_test()
 
 if __name__ == '__main__':
-    downloadCorpus()
     main()
@@ -0,0 +1,95 @@
+import json
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+# logging and tracemalloc are only imported by an enabled Stats, so that a model that only decodes does not pay for
+# importing them
+
+# the phase of a disabled Stats, which records nothing
+NO_PHASE = nullcontext()
+
+
+class Phase:
+    """
+    A context manager that records the wall time and the change of traced memory of a phase.
+    """
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        import tracemalloc
+        self.memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        import tracemalloc
+        seconds = time.perf_counter() - self.start
+        self.stats.phases[self.name] = {
+            'seconds': seconds,
+            'allocatedBytes': tracemalloc.get_traced_memory()[0] - self.memory,
+        }
+        return False
+
+
+class Stats:
+    """
+    Optional instrumentation of the phases of training and the counters of decoding.
+
+    A disabled Stats records nothing; the code that updates the counters checks the enabled flag first, so the cost
+    of the instrumentation is a single attribute lookup when it is disabled.
+    """
+
+    def __init__(self, enabled=False, sink=None):
+        """
+        :param enabled: Whether to record the phases and the counters
+        :param sink: None, the path of a file that each emitted record is appended to as a JSON line, or a logger
+        """
+        self.enabled = enabled
+        self.sink = sink
+        self.phases = {}
+        self.counters = Counter()
+        self.unkSubstitutions = Counter()
+        if enabled:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                # the allocation deltas of the phases are measured with tracemalloc
+                tracemalloc.start()
+
+    def phase(self, name):
+        """
+        :param name: The name of the phase
+        :return: A context manager that records the phase, or one that does nothing if the Stats is disabled
+        """
+        return Phase(self, name) if self.enabled else NO_PHASE
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def asDict(self):
+        return {
+            'phases': dict(self.phases),
+            'counters': dict(self.counters),
+            'unkSubstitutions': dict(self.unkSubstitutions),
+        }
+
+    def emit(self, event, extra=None):
+        """
+        Send the current statistics to the sink.
+
+        :param event: The name of the event, i.e. 'setup'
+        :param extra: A dictionary of further statistics to include
+        """
+        if not self.enabled or self.sink is None:
+            return
+
+        import logging
+        record = dict(self.asDict(), event=event, time=time.time(), **(extra or {}))
+        if isinstance(self.sink, logging.Logger):
+            self.sink.info(json.dumps(record))
+        else:
+            with open(self.sink, 'a') as f:
+                f.write(json.dumps(record) + '\n')
@@ -0,0 +1,115 @@
+import json
+import mmap
+import os
+import struct
+import uuid
+import numpy as np
+
+MAGIC = b'POSHMM\x00\x00'
+VERSION = 1
+ALIGNMENT = 64
+
+# magic, version, length of the JSON header
+PREAMBLE = struct.Struct('<8sII')
+
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def encodeStrings(strings):
+    """
+    Encode a list of strings as a UTF-8 blob and an array of offsets into it.
+
+    :param strings: A list of strings
+    :return blob: A uint8 array with the concatenated UTF-8 bytes
+    :return offsets: An int64 array of shape (len(strings)+1,) with the start of each string in the blob
+    """
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def decodeStrings(blob, offsets):
+    """
+    Decode a list of strings that was encoded with encodeStrings().
+    """
+    data = blob.tobytes()
+    offsets = offsets.tolist()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def writeModel(path, header, arrays):
+    """
+    Write a model file atomically.
+
+    The file starts with a fixed preamble and a JSON header, followed by the raw arrays. Each array starts at an
+    aligned offset, so that the file can be memory-mapped and the arrays used in place.
+
+    :param path: The path of the model file
+    :param header: A JSON serialisable dictionary
+    :param arrays: A dictionary that maps names to NumPy arrays
+    """
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    layout = {}
+    headerBytes = b''
+
+    # the offsets of the arrays depend on the length of the header, which contains the offsets
+    while True:
+        offset = align(PREAMBLE.size + len(headerBytes))
+        for name, a in arrays.items():
+            layout[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+            offset = align(offset + a.nbytes)
+        newHeaderBytes = json.dumps(dict(header, arrays=layout)).encode('utf-8')
+        if len(newHeaderBytes) == len(headerBytes):
+            break
+        headerBytes = newHeaderBytes
+
+    # the file is written next to the target and then renamed over it, so that processes that have the old file
+    # memory-mapped keep reading the old inode instead of a truncated one
+    temporaryPath = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+    try:
+        with open(temporaryPath, 'xb') as f:
+            f.write(PREAMBLE.pack(MAGIC, VERSION, len(headerBytes)))
+            f.write(headerBytes)
+            for name, a in arrays.items():
+                f.seek(layout[name]['offset'])
+                f.write(a.tobytes())
+            # empty arrays at the end of the file still need their offset to exist
+            f.truncate(offset)
+        os.replace(temporaryPath, path)
+    except BaseException:
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        raise
+
+
+def readModel(path):
+    """
+    Memory-map a model file that was written with writeModel().
+
+    The returned arrays are read-only views of the mapped file, so processes that load the same file share its pages.
+
+    :param path: The path of the model file
+    :return header: The JSON header
+    :return arrays: A dictionary that maps names to NumPy arrays
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, headerLength = PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('{} is not a model file'.format(path))
+    if version != VERSION:
+        raise ValueError('Unsupported model file version {} (expected {})'.format(version, VERSION))
+
+    header = json.loads(buffer[PREAMBLE.size:PREAMBLE.size + headerLength].decode('utf-8'))
+    arrays = {}
+    for name, spec in header.pop('arrays').items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=spec['offset']).reshape(spec['shape'])
+
+    return header, arrays
@@ -1,21 +1,22 @@
-import nltk
 import sys
 import time
-from hmm import HMM
-from unk import HMM_UNK
-from nltk.corpus import conll2000, conll2002, alpino, floresta, cess_esp
+from corpusCache import openCorpus
 
+# the models are imported by the functions that train them, so that the table of corpora can be imported on its own
 
+# the corpora that can be selected by number, as (corpus name, tagset, language of the UNK rules)
+CORPORA = {
+    1: ('alpino', "", 'du'),  # Dutch
+    2: ('floresta', "", 'po'),  # floresta = 9k sentences, tagged and parsed (Portuguese)
+    3: ('conll2002', "esp", 'es'),  # conll2002 contains both Spanish and Dutch sentences
+    4: ('conll2000', "universal", 'en'),  # English
+    5: ('cess_esp', "", 'es'),  # 1M words, tagged and parsed (Catalan, Spanish)
+}
 
-def downloadCorpus():
-    nltk.download('alpino')
-    nltk.download('floresta')
-    nltk.download('conll2000')
-    nltk.download('conll2002')
 
-def main_otherLang_UNK(corpus, tagset, lang):
-    tagged_sents = list(corpus.tagged_sents())
-    numOfSents = len(tagged_sents)
+def main_otherLang_UNK(corpus, tagset, lang, workers=1):
+    from unk import HMM_UNK
+    numOfSents = len(corpus.tagged_sents())
     print('The number of total sentences = {}'.format(numOfSents))
 
     # train : test = 95 : 5
@@ -24,11 +25,11 @@ def main_otherLang_UNK(corpus, tagset, lang):
 
     hmm = HMM_UNK(corpus, tagset, trainSize=train_size, testSize=test_size, lang=lang)
     hmm.setup()
-    hmm.viterbi_test()
+    hmm.viterbi_test(workers)
 
-def main_otherLang(corpus, tagset):
-    tagged_sents = list(corpus.tagged_sents())
-    numOfSents = len(tagged_sents)
+def main_otherLang(corpus, tagset, workers=1):
+    from hmm import HMM
+    numOfSents = len(corpus.tagged_sents())
     print('The number of total sentences = {}'.format(numOfSents))
 
     # train : test = 95 : 5
@@ -37,12 +38,10 @@ def main_otherLang(corpus, tagset):
 
     hmm = HMM(corpus, tagset, trainSize=train_size, testSize=test_size)
     hmm.setup()
-    hmm.viterbi_test()
+    hmm.viterbi_test(workers)
 
 
 if __name__ == '__main__':
-    downloadCorpus()
-
     selected_corpus = ''
     try:
         selected_corpus = int(sys.argv[1])
@@ -61,43 +60,29 @@ if __name__ == '__main__':
             print('The second argument should be either y or n')
             exit(1)
 
-    start = time.time()
+    # check if the user input 3rd command line argument
+    workers = 1
+    if len(sys.argv) > 3:
+        try:
+            workers = int(sys.argv[3])
+        except ValueError:
+            workers = 0
+        if workers < 1:
+            print('The third argument should be a positive number of worker processes')
+            exit(1)
 
-    if selected_corpus == 1:
-        print('\nHMM for alpino')
-        if unk:
-            main_otherLang_UNK(alpino, "", 'du')
-        else:
-            main_otherLang(alpino, "")
-    elif selected_corpus == 2:
-        print('\nHMM for floresta')
-        # floresta = 9k sentences, tagged and parsed (Portuguese)
-        if unk:
-            main_otherLang_UNK(floresta, "", 'po')
-        else:
-            main_otherLang(floresta, "")
-    elif selected_corpus == 3:
-        print('\nHMM for conll2002')
-        # conll2002 contains both Spanish and Dutch sentences
-        if unk:
-            main_otherLang_UNK(conll2002, "esp", 'es')
-        else:
-            main_otherLang(conll2002, "esp")
-    elif selected_corpus == 4:
-        print('\nHMM for conll2000')
-        if unk:
-            main_otherLang_UNK(conll2000, "universal", "en")
-        else:
-            main_otherLang(conll2000, "universal")
-    elif selected_corpus == 5:
-        # 1M words, tagged and parsed (Catalan, Spanish)
-        if unk:
-            main_otherLang_UNK(cess_esp, "", "es")
-        else:
-            main_otherLang(cess_esp, "")
-    else:
+    if selected_corpus not in CORPORA:
         print('The first argument should be one of 1, 2, 3, 4, and 5')
         exit(1)
 
+    start = time.time()
+
+    name, tagset, lang = CORPORA[selected_corpus]
+    print('\nHMM for {}'.format(name))
+    if unk:
+        main_otherLang_UNK(openCorpus(name, tagset), tagset, lang, workers)
+    else:
+        main_otherLang(openCorpus(name, tagset), tagset, workers)
+
     costTime = time.time() - start
     print('Total cost time = {0:.2f}'.format(costTime))
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+import tempfile
+
+# the model of a worker process, loaded once by initWorker()
+workerModel = None
+
+
+def initWorker(modelClass, path):
+    """
+    Load the shared model file in a worker process.
+
+    The model file is memory-mapped, so all workers share the pages of the compiled arrays.
+    """
+    global workerModel
+    workerModel = modelClass.load(path)
+
+
+def decodeChunk(sentences):
+    # a chunk is decoded in buckets of similar length, like viterbiBatch()
+    return workerModel.decodeBatch(sentences)
+
+
+def viterbiParallel(hmm, sentences, workers=None, chunkSize=256):
+    """
+    Tag the sentences with a pool of worker processes.
+
+    The model is shared through its model file instead of being pickled to each worker. If the model has not been
+    saved or loaded, it is saved to a temporary file for the duration of the call.
+
+    :param hmm: A compiled HMM or HMM_UNK
+    :param sentences: A list of sentences, where each sentence is a list of words
+    :param workers: The number of worker processes, or None for the number of CPUs
+    :param chunkSize: The number of sentences that are sent to a worker at a time, and decoded there as one batch
+    :return finalTags: A list of tag lists, in the same order as sentences
+    """
+    path = getattr(hmm, 'modelPath', None)
+    temporaryPath = None
+    if path is None:
+        fd, temporaryPath = tempfile.mkstemp(suffix='.hmm')
+        os.close(fd)
+        hmm.save(temporaryPath)
+        path = temporaryPath
+
+    chunks = [sentences[i:i + chunkSize] for i in range(0, len(sentences), chunkSize)]
+    try:
+        with multiprocessing.Pool(workers, initializer=initWorker, initargs=(type(hmm), path)) as pool:
+            results = pool.map(decodeChunk, chunks, chunksize=1)
+    finally:
+        if temporaryPath is not None:
+            hmm.modelPath = None
+            os.remove(temporaryPath)
+
+    return [tags for chunk in results for tags in chunk]
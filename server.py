@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+import numpy as np
+from tagger import loadModel
+
+
+class TaggingServer:
+    """
+    A local tagging server, which speaks JSON lines over a Unix socket or TCP.
+
+    Each request is a line {"id": ..., "sentence": [words]}, and is answered by a line {"id": ..., "tags": [tags]}.
+    A line {"id": ..., "stats": true} is answered with the statistics of the server. Sentences that arrive within
+    maxWait seconds of each other are tagged together as one batch of at most maxBatchSize sentences.
+    """
+
+    def __init__(self, hmm, maxBatchSize=64, maxWait=0.005, latencyWindow=10000):
+        """
+        :param hmm: A trained or loaded model
+        :param maxBatchSize: The maximum number of sentences that are tagged as one batch
+        :param maxWait: The number of seconds that the first sentence of a batch waits for more sentences
+        :param latencyWindow: The number of most recent requests that the latency percentiles are computed over
+        """
+        self.hmm = hmm
+        self.maxBatchSize = maxBatchSize
+        self.maxWait = maxWait
+        self.latencies = deque(maxlen=latencyWindow)
+        self.requests = 0
+        self.batches = 0
+        self.queue = None
+        self.server = None
+        self.batcher = None
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """
+        Start listening on a Unix socket, or on a TCP port if no path is given.
+
+        :param path: The path of the Unix socket, or None
+        :param host: The TCP host
+        :param port: The TCP port, where 0 picks a free port
+        """
+        if not self.hmm.compiled:
+            self.hmm.compile()
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.ensure_future(self.runBatches())
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handleConnection, path=path)
+        else:
+            self.server = await asyncio.start_server(self.handleConnection, host, port)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+
+    def address(self):
+        """
+        :return: The path of the Unix socket, or the (host, port) of the TCP socket
+        """
+        return self.server.sockets[0].getsockname()
+
+    async def tag(self, sentence):
+        """
+        Queue a sentence for the next batch, and wait for its tags.
+
+        :param sentence: A list of words
+        :return: A list of tags
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((sentence, future, time.perf_counter()))
+        return await future
+
+    async def runBatches(self):
+        """
+        Collect the queued sentences into batches, and tag each batch in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.maxWait
+            while len(batch) < self.maxBatchSize:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            sentences = [sentence for sentence, _, _ in batch]
+            try:
+                # the event loop keeps accepting requests while the batch is decoded
+                results = await loop.run_in_executor(None, self.hmm.viterbiBatch, sentences, self.maxBatchSize)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            self.batches += 1
+            for (_, future, queued), tags in zip(batch, results):
+                self.requests += 1
+                self.latencies.append(finished - queued)
+                if not future.done():
+                    future.set_result(tags)
+
+    async def handleConnection(self, reader, writer):
+        pending = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            task = asyncio.ensure_future(self.answer(line, writer))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+        writer.close()
+
+    async def answer(self, line, writer):
+        """
+        Answer a single request line.
+        """
+        request = {}
+        try:
+            request = json.loads(line)
+            if request.get('stats'):
+                response = {'id': request.get('id'), 'stats': self.stats()}
+            else:
+                sentence = request['sentence']
+                # a bad sentence is rejected here, since in a batch it would fail the other requests with it
+                if not isinstance(sentence, list) or not all(isinstance(w, str) for w in sentence):
+                    raise ValueError('The sentence must be a list of words')
+                response = {'id': request.get('id'), 'tags': await self.tag(sentence)}
+        except Exception as e:
+            # a malformed request is answered with an error, and does not close the connection
+            response = {'id': request.get('id') if isinstance(request, dict) else None, 'error': str(e)}
+        writer.write((json.dumps(response) + '\n').encode('utf-8'))
+        await writer.drain()
+
+    def stats(self):
+        """
+        :return: A dictionary with the queue depth, the number of requests and batches, and the latency percentiles
+        """
+        stats = {
+            'queueDepth': self.queue.qsize() if self.queue is not None else 0,
+            'requests': self.requests,
+            'batches': self.batches,
+            'meanBatchSize': self.requests / self.batches if self.batches else 0.0,
+        }
+        if self.hmm.sentenceCache is not None:
+            stats['sentenceCache'] = self.hmm.sentenceCache.stats()
+        if self.latencies:
+            p50, p90, p99 = np.percentile(np.array(self.latencies), [50, 90, 99])
+            stats['latencySeconds'] = {'p50': p50, 'p90': p90, 'p99': p99, 'max': max(self.latencies)}
+        return stats
+
+
+async def tagSentences(sentences, path=None, host='127.0.0.1', port=None):
+    """
+    A simple client, which sends all the sentences over one connection and waits for all the answers.
+
+    :param sentences: A list of sentences, where each sentence is a list of words
+    :param path: The path of the Unix socket of the server, or None to connect over TCP
+    :return finalTags: A list of tag lists, in the same order as sentences
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    for i, s in enumerate(sentences):
+        writer.write((json.dumps({'id': i, 'sentence': s}) + '\n').encode('utf-8'))
+    await writer.drain()
+
+    finalTags = [None] * len(sentences)
+    for _ in range(len(sentences)):
+        response = json.loads(await reader.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        finalTags[response['id']] = response['tags']
+
+    writer.close()
+    await writer.wait_closed()
+    return finalTags
+
+
+async def requestStats(path=None, host='127.0.0.1', port=None):
+    """
+    :return: The statistics of a running server
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"stats": true}\n')
+    response = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return response['stats']
+
+
+async def runDemo(numOfClients=8, maxBatchSize=64, maxWait=0.005):
+    """
+    Train a model on a synthetic corpus, serve it on a temporary Unix socket, and tag the testing sentences with
+    several concurrent clients.
+    """
+    from hmm import HMM
+    from synthetic import SyntheticCorpus
+    corpus = SyntheticCorpus(numOfSents=3000, vocabSize=5000)
+    hmm = HMM(corpus, trainSize=2500, testSize=500)
+    hmm.setup()
+
+    path = os.path.join(tempfile.mkdtemp(), 'tagger.sock')
+    server = TaggingServer(hmm, maxBatchSize, maxWait)
+    await server.start(path)
+    try:
+        sentences = hmm.testingWordsNoDelim
+        shares = [sentences[i::numOfClients] for i in range(numOfClients)]
+        results = await asyncio.gather(*[tagSentences(share, path) for share in shares])
+        expected = [hmm.decodeSentence(s) for s in sentences]
+        served = [None] * len(sentences)
+        for i, tags in enumerate(results):
+            served[i::numOfClients] = tags
+        stats = await requestStats(path)
+    finally:
+        await server.stop()
+        os.remove(path)
+
+    print(json.dumps(dict(stats, matchesDirectDecoding=served == expected), indent=2))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(prog='server.py', description='Serve a saved model over a local socket.')
+    parser.add_argument('model', help='the model file, or "demo" to serve a model trained on a synthetic corpus')
+    parser.add_argument('--socket', help='the path of a Unix socket to listen on')
+    parser.add_argument('--host', default='127.0.0.1', help='the TCP host to listen on, if no socket is given')
+    parser.add_argument('--port', type=int, default=8765, help='the TCP port to listen on, if no socket is given')
+    parser.add_argument('--batch-size', type=int, default=64, help='the maximum number of sentences of a batch')
+    parser.add_argument('--wait', type=float, default=0.005, help='the number of seconds a batch waits for more sentences')
+    parser.add_argument('--sentence-cache', type=int, default=0,
+                        help='the number of distinct sentences whose tags are cached, 0 to disable the cache')
+    parser.add_argument('--sentence-cache-spill', help='a dbm file that the sentences evicted from the cache are kept in')
+    options = parser.parse_args(args)
+
+    if options.model == 'demo':
+        asyncio.run(runDemo(maxBatchSize=options.batch_size, maxWait=options.wait))
+        return
+
+    async def serve():
+        hmm = loadModel(options.model)
+        if options.sentence_cache > 0:
+            hmm.enableSentenceCache(options.sentence_cache, options.sentence_cache_spill)
+        server = TaggingServer(hmm, options.batch_size, options.wait)
+        await server.start(options.socket, options.host, options.port)
+        print('Serving {} on {}'.format(options.model, server.address()))
+        await server.server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
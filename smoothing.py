@@ -1,16 +1,170 @@
-from nltk import FreqDist, WittenBellProbDist
+import numpy as np
 
+# the number of possible events of every distribution, as in WittenBellProbDist(freqdist, bins=1e5)
+BINS = 1e5
 
-emissions = [('N', 'apple'), ('N', 'apple'), ('N', 'banana'), ('Adj', 'apple'), ('V', 'sing')]
-smoothed = {}
-tags = set([t for (t,_) in emissions])
 
-for tag in tags:
-    words = [w for (t,w) in emissions if t == tag]
-    smoothed[tag] = WittenBellProbDist(FreqDist(words), bins=1e5)
+class Smoothing:
+    """
+    A smoothing method, which turns the counts of the seen events of a distribution into probabilities, and reserves
+    probability mass for the unseen events.
 
-print('probability of N -> apple is', smoothed['N'].prob('apple'))
-print('probability of N -> banana is', smoothed['N'].prob('banana'))
-print('probability of N -> peach is', smoothed['N'].prob('peach'))
-print('probability of V -> sing is', smoothed['V'].prob('sing'))
-print('probability of V -> walk is', smoothed['V'].prob('walk'))
+    Subclasses implement probabilities(); the log probabilities of a single row or of a dense count matrix are built
+    on top of it.
+    """
+    name = None
+
+    def __init__(self, bins=BINS):
+        """
+        :param bins: The number of possible events, which must not be less than the number of seen events of a row
+        """
+        self.bins = bins
+
+    def probabilities(self, counts, totals, types):
+        """
+        :param counts: An array of the counts of seen events
+        :param totals: An array with the total count N of the row of each event
+        :param types: An array with the number of seen events B of the row of each event
+        :return: An array with the probability of each event
+        """
+        raise NotImplementedError()
+
+    def unseenProbabilities(self, totals, types):
+        """
+        :param totals: An array with the total count N of each row
+        :param types: An array with the number of seen events B of each row
+        :return: An array with the probability of an unseen event of each row
+        """
+        raise NotImplementedError()
+
+    def rowLogProbs(self, counts):
+        """
+        Smooth a single distribution.
+
+        :param counts: An array of the counts of the seen events, which are all positive
+        :return logProbs: An array with the log probability of each seen event
+        :return logUnseen: The log probability of an unseen event
+        """
+        counts = np.asarray(counts, dtype=np.float64)
+        total = np.array([counts.sum()])
+        types = np.array([len(counts)])
+        with np.errstate(divide='ignore'):
+            logProbs = np.log(self.probabilities(counts, np.repeat(total, len(counts)), np.repeat(types, len(counts))))
+            logUnseen = np.log(self.unseenProbabilities(total, types))[0]
+        return logProbs, logUnseen
+
+    def denseLogProbs(self, countMatrix):
+        """
+        Smooth every row of a dense count matrix, where a count of zero is an unseen event.
+
+        :param countMatrix: An array of shape (R, C)
+        :return: An array of shape (R, C) with the log probabilities
+        """
+        countMatrix = np.asarray(countMatrix, dtype=np.float64)
+        totals = countMatrix.sum(axis=1)
+        types = np.count_nonzero(countMatrix, axis=1)
+        rows, columns = np.nonzero(countMatrix)
+
+        probs = np.repeat(self.unseenProbabilities(totals, types)[:, None], countMatrix.shape[1], axis=1)
+        probs[rows, columns] = self.probabilities(countMatrix[rows, columns], totals[rows], types[rows])
+        with np.errstate(divide='ignore'):
+            return np.log(probs)
+
+
+class WittenBell(Smoothing):
+    """
+    The Witten-Bell estimate, which gives the same probabilities as nltk.WittenBellProbDist with the same bins.
+
+    - p = c / (N + B) for a seen event
+    - p = B / (Z * (N + B)) for an unseen event, where Z = bins - B, or 1 / Z if nothing was seen
+    """
+    name = 'wittenbell'
+
+    def probabilities(self, counts, totals, types):
+        return counts / (totals + types)
+
+    def unseenProbabilities(self, totals, types):
+        unseenBins = self.bins - types
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(totals == 0, 1.0 / unseenBins, types / (unseenBins * (totals + types)))
+
+
+class Laplace(Smoothing):
+    """
+    Additive smoothing, which adds alpha to the count of every possible event.
+
+    - p = (c + alpha) / (N + alpha * bins)
+    """
+    name = 'laplace'
+
+    def __init__(self, alpha=1.0, bins=BINS):
+        super().__init__(bins)
+        self.alpha = alpha
+
+    def probabilities(self, counts, totals, types):
+        return (counts + self.alpha) / (totals + self.alpha * self.bins)
+
+    def unseenProbabilities(self, totals, types):
+        return self.alpha / (totals + self.alpha * self.bins)
+
+
+class AbsoluteDiscounting(Smoothing):
+    """
+    Absolute discounting, which subtracts a fixed discount from the count of every seen event, and shares the
+    discounted mass evenly between the unseen events.
+
+    - p = (c - discount) / N for a seen event
+    - p = discount * B / (N * (bins - B)) for an unseen event, or 1 / bins if nothing was seen
+    """
+    name = 'absolute'
+
+    def __init__(self, discount=0.75, bins=BINS):
+        super().__init__(bins)
+        self.discount = discount
+
+    def probabilities(self, counts, totals, types):
+        return (counts - self.discount) / totals
+
+    def unseenProbabilities(self, totals, types):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(totals == 0, 1.0 / self.bins, self.discount * types / (totals * (self.bins - types)))
+
+
+# the smoothing methods by name
+SMOOTHING = {cls.name: cls for cls in [WittenBell, Laplace, AbsoluteDiscounting]}
+
+
+def getSmoothing(smoothing, bins=BINS):
+    """
+    :param smoothing: A Smoothing, or the name of a smoothing method, i.e. 'wittenbell'
+    :param bins: The number of possible events of a smoothing method that is given by name; a Smoothing keeps its own
+    :return: A Smoothing
+    """
+    if isinstance(smoothing, Smoothing):
+        return smoothing
+    if smoothing not in SMOOTHING:
+        raise ValueError('Unknown smoothing "{}", expected one of {}'.format(smoothing, sorted(SMOOTHING)))
+    return SMOOTHING[smoothing](bins=bins)
+
+
+if __name__ == '__main__':
+    emissions = [('N', 'apple'), ('N', 'apple'), ('N', 'banana'), ('Adj', 'apple'), ('V', 'sing')]
+    tags = set([t for (t, _) in emissions])
+
+    for smoothing in [WittenBell(), Laplace(), AbsoluteDiscounting()]:
+        smoothed = {}
+        for tag in tags:
+            words = sorted(set(w for (t, w) in emissions if t == tag))
+            logProbs, logUnseen = smoothing.rowLogProbs([sum(1 for e in emissions if e == (tag, w)) for w in words])
+            smoothed[tag] = (dict(zip(words, np.exp(logProbs))), np.exp(logUnseen))
+
+        def prob(tag, word):
+            seen, unseen = smoothed[tag]
+            return seen.get(word, unseen)
+
+        print(smoothing.name)
+        print('probability of N -> apple is', prob('N', 'apple'))
+        print('probability of N -> banana is', prob('N', 'banana'))
+        print('probability of N -> peach is', prob('N', 'peach'))
+        print('probability of V -> sing is', prob('V', 'sing'))
+        print('probability of V -> walk is', prob('V', 'walk'))
@@ -0,0 +1,88 @@
+import numpy as np
+
+# suffixes that are appended to some of the generated words, so that the UNK rules have something to match
+SUFFIXES = ['', '', '', 'ing', 'ion', 'ed', 'ly', 's', 'er', 'al', 'ous', 'en', 'te', 'mente', 'ción', 'ado', 'eiro']
+LETTERS = list('abcdefghijklmnopqrstuvwxyz')
+
+
+class SyntheticCorpus:
+    """
+    A seeded, randomly generated tagged corpus with the tagged_sents() and sents() methods of an NLTK corpus reader.
+
+    Tags follow a random first-order Markov chain, and each tag emits words from its own share of the vocabulary
+    with Zipf-distributed frequencies. A small fraction of the words is taken from the share of another tag, so
+    some words are ambiguous.
+    """
+
+    def __init__(self, numOfSents=10000, vocabSize=20000, numOfTags=12, meanLength=20, zipf=1.1, ambiguity=0.1,
+                 seed=0):
+        """
+        :param numOfSents: The number of sentences
+        :param vocabSize: The number of distinct words, which is at least numOfTags
+        :param numOfTags: The number of distinct tags
+        :param meanLength: The mean number of words of a sentence; lengths are 1 + Poisson(meanLength - 1)
+        :param zipf: The exponent of the Zipf distribution of the word frequencies
+        :param ambiguity: The probability that a word is taken from the share of another tag
+        :param seed: The random seed
+        """
+        self.config = {
+            'numOfSents': numOfSents, 'vocabSize': vocabSize, 'numOfTags': numOfTags, 'meanLength': meanLength,
+            'zipf': zipf, 'ambiguity': ambiguity, 'seed': seed,
+        }
+        rng = np.random.default_rng(seed)
+
+        tags = ['T{}'.format(i) for i in range(numOfTags)]
+        words = self.generateWords(rng, vocabSize)
+
+        # split the vocabulary between the tags, and give the words of each tag Zipf-distributed frequencies
+        owner = rng.permutation(np.arange(vocabSize) % numOfTags)
+        shares = [np.flatnonzero(owner == t) for t in range(numOfTags)]
+        cumWeights = [np.cumsum(1.0 / np.arange(1, len(share) + 1) ** zipf) for share in shares]
+
+        cumStart = np.cumsum(rng.dirichlet(np.ones(numOfTags)))
+        cumTransition = np.cumsum(rng.dirichlet(np.full(numOfTags, 0.5), size=numOfTags), axis=1)
+        lengths = 1 + rng.poisson(max(meanLength - 1, 0), size=numOfSents)
+        numOfTokens = int(lengths.sum())
+
+        # the tag chain is sampled token by token, and the words of each tag are sampled at once
+        draws = rng.random(numOfTokens)
+        tagIds = np.empty(numOfTokens, dtype=np.intp)
+        i = 0
+        for length in lengths:
+            t = min(int(np.searchsorted(cumStart, draws[i] * cumStart[-1])), numOfTags - 1)
+            for _ in range(length):
+                tagIds[i] = t
+                i += 1
+                if i < numOfTokens:
+                    t = min(int(np.searchsorted(cumTransition[t], draws[i] * cumTransition[t][-1])), numOfTags - 1)
+
+        sources = np.where(rng.random(numOfTokens) < ambiguity, rng.integers(0, numOfTags, size=numOfTokens), tagIds)
+        wordIds = np.empty(numOfTokens, dtype=np.intp)
+        for t in range(numOfTags):
+            positions = np.flatnonzero(sources == t)
+            ranks = np.searchsorted(cumWeights[t], rng.random(len(positions)) * cumWeights[t][-1])
+            wordIds[positions] = shares[t][np.minimum(ranks, len(shares[t]) - 1)]
+
+        self.taggedSents = []
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            self.taggedSents.append([(words[w], tags[t]) for w, t in zip(wordIds[start:end].tolist(),
+                                                                         tagIds[start:end].tolist())])
+
+    @staticmethod
+    def generateWords(rng, vocabSize):
+        words = []
+        seen = set()
+        while len(words) < vocabSize:
+            stem = ''.join(rng.choice(LETTERS, size=rng.integers(2, 8)))
+            word = stem + SUFFIXES[rng.integers(0, len(SUFFIXES))]
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    def tagged_sents(self, tagset=None):
+        return self.taggedSents
+
+    def sents(self):
+        return [[w for (w, _) in s] for s in self.taggedSents]
@@ -0,0 +1,104 @@
+import argparse
+import importlib
+import json
+import sys
+from modelFile import readModel
+
+# the module of each model class, by the name in the header of a model file; only the module of the loaded model is
+# imported, and none of them import NLTK, so tagging with a saved model never loads it
+MODEL_MODULES = {
+    'HMM': 'hmm',
+    'HMM_UNK': 'unk',
+    'TrigramHMM': 'trigram',
+    'TrigramHMM_UNK': 'trigram',
+}
+
+
+def loadModel(path):
+    """
+    Load a model file that was written by save(), as the class that saved it.
+
+    :param path: The path of the model file
+    :return: A compiled model, ready for decoding
+    """
+    header, _ = readModel(path)
+    if header['model'] not in MODEL_MODULES:
+        raise ValueError('{} contains an unknown model {}'.format(path, header['model']))
+    modelClass = getattr(importlib.import_module(MODEL_MODULES[header['model']]), header['model'])
+    return modelClass.load(path)
+
+
+def readSentences(lines):
+    """
+    :param lines: An iterable of lines, with one sentence of whitespace-separated words on each line
+    :return: A generator of sentences, where each sentence is a list of words; blank lines are skipped
+    """
+    for line in lines:
+        words = line.split()
+        if words:
+            yield words
+
+
+def tagSentences(hmm, sentences, batchSize=256):
+    """
+    Tag sentences in batches.
+
+    :param hmm: A compiled model
+    :param sentences: An iterable of sentences, where each sentence is a list of words
+    :param batchSize: The number of sentences that are decoded together
+    :return: A generator of (sentence, tags) pairs, in the same order as sentences
+    """
+    batch = []
+    for s in sentences:
+        batch.append(s)
+        if len(batch) == batchSize:
+            yield from zip(batch, hmm.viterbiBatch(batch, batchSize))
+            batch = []
+    if batch:
+        yield from zip(batch, hmm.viterbiBatch(batch, batchSize))
+
+
+def formatTagged(sentence, tags, outputFormat='slash'):
+    """
+    :param outputFormat: 'slash' for word/tag tokens, or 'json' for a JSON object with the words and the tags
+    :return: A line of text
+    """
+    if outputFormat == 'json':
+        return json.dumps({'sentence': sentence, 'tags': tags})
+    return ' '.join('{}/{}'.format(w, t) for w, t in zip(sentence, tags))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(prog='tagger.py',
+                                     description='Tag text with a saved model, without loading NLTK or a corpus.')
+    parser.add_argument('model', help='the model file, written by save()')
+    parser.add_argument('--input', help='a file with one sentence of whitespace-separated words per line, by default '
+                                        'stdin')
+    parser.add_argument('--output', help='the file to write the tagged sentences to, by default stdout')
+    parser.add_argument('--batch-size', type=int, default=256, help='the number of sentences decoded together')
+    parser.add_argument('--format', choices=['slash', 'json'], default='slash', help='the output format')
+    parser.add_argument('--sentence-cache', type=int, default=0,
+                        help='the number of distinct sentences whose tags are cached, 0 to disable the cache')
+    parser.add_argument('--sentence-cache-spill', help='a dbm file that the sentences evicted from the cache are kept in')
+    options = parser.parse_args(args)
+
+    hmm = loadModel(options.model)
+    if options.sentence_cache > 0:
+        hmm.enableSentenceCache(options.sentence_cache, options.sentence_cache_spill)
+    source = open(options.input, encoding='utf-8') if options.input else sys.stdin
+    target = open(options.output, 'w', encoding='utf-8') if options.output else sys.stdout
+    try:
+        for sentence, tags in tagSentences(hmm, readSentences(source), options.batch_size):
+            target.write(formatTagged(sentence, tags, options.format) + '\n')
+    finally:
+        if options.input:
+            source.close()
+        if options.output:
+            target.close()
+        if hmm.sentenceCache is not None:
+            hmm.sentenceCache.close()
+            print(json.dumps({'sentenceCache': hmm.sentenceCache.stats()}), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
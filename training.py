@@ -0,0 +1,365 @@
+from array import array
+from collections import Counter
+import numpy as np
+
+
+def countSentences(sentences):
+    """
+    Count a shard of tagged sentences.
+
+    Every sentence is counted as if another sentence followed it, so the counts of consecutive shards add up to the
+    counts of the whole corpus, except for the corrections made by finaliseCounts().
+
+    :param sentences: A list of tagged sentences
+    :return occurrences_w: A Counter of the words, including the delimiters
+    :return occurrences_t: A Counter of the tags, including the delimiters
+    :return emissionPairs: A Counter of (tag, word) pairs
+    :return bigramPairs: A Counter of (prevTag, curTag) pairs, including the delimiters
+    """
+    occurrences_w = Counter()
+    occurrences_t = Counter()
+    emissionPairs = Counter()
+    bigramPairs = Counter()
+
+    for s in sentences:
+        words = ['<s>'] + [w for (w, _) in s] + ['</s>']
+        tags = ['<s>'] + [t for (_, t) in s] + ['</s>']
+        occurrences_w.update(words)
+        occurrences_t.update(tags)
+        emissionPairs.update(zip(tags, words))
+        # the end of the sentence is followed by the start of the next one
+        bigramPairs.update(zip(tags, tags[1:] + ['<s>']))
+
+    return occurrences_w, occurrences_t, emissionPairs, bigramPairs
+
+
+def mergeCounts(total, partial):
+    """
+    Add the counts of a shard to the total counts.
+    """
+    for totalCounter, partialCounter in zip(total, partial):
+        totalCounter.update(partialCounter)
+    return total
+
+
+def finaliseCounts(counts, lastSentence):
+    """
+    Remove the counts of the last token of the corpus, which only closes the final sentence.
+
+    The final </s> is neither an emission nor followed by another sentence, and it is not the target of a transition.
+
+    :param counts: The merged counts of all shards
+    :param lastSentence: The last tagged sentence of the corpus
+    :return: The corrected counts
+    """
+    occurrences_w, occurrences_t, emissionPairs, bigramPairs = counts
+    lastTag = lastSentence[-1][1] if len(lastSentence) > 0 else '<s>'
+
+    emissionPairs[('</s>', '</s>')] -= 1
+    bigramPairs[('</s>', '<s>')] -= 1
+    bigramPairs[(lastTag, '</s>')] -= 1
+
+    # drop the pairs that are no longer counted
+    return occurrences_w, occurrences_t, +emissionPairs, +bigramPairs
+
+
+class EncodedSentences:
+    """
+    Tagged sentences as interned word and tag IDs in flat arrays, with the sentence boundaries kept as offsets instead
+    of inline delimiters.
+
+    Words and tags are interned in order of their first occurrence.
+    """
+
+    def __init__(self, sentences=()):
+        self.words = []
+        self.tags = []
+        self.wordIndex = {}
+        self.tagIndex = {}
+        self.wordIds = array('i')
+        self.tagIds = array('i')
+        self.offsets = array('q', [0])
+        self.extend(sentences)
+
+    @property
+    def numOfSents(self):
+        return len(self.offsets) - 1
+
+    def extend(self, sentences):
+        """
+        Append tagged sentences.
+        """
+        words, wordIndex = self.words, self.wordIndex
+        tags, tagIndex = self.tags, self.tagIndex
+        for s in sentences:
+            for (w, t) in s:
+                wordId = wordIndex.get(w)
+                if wordId is None:
+                    wordId = wordIndex[w] = len(words)
+                    words.append(w)
+                tagId = tagIndex.get(t)
+                if tagId is None:
+                    tagId = tagIndex[t] = len(tags)
+                    tags.append(t)
+                self.wordIds.append(wordId)
+                self.tagIds.append(tagId)
+            self.offsets.append(len(self.wordIds))
+
+    def extendEncoded(self, words, tags, wordIds, tagIds, offsets):
+        """
+        Append sentences that were encoded by another EncodedSentences, i.e. in a worker process.
+
+        The IDs are mapped to the IDs of this vocabulary with array operations, so only the strings of the other
+        vocabulary are interned one at a time.
+
+        :param words: The interned words of the other EncodedSentences
+        :param tags: The interned tags of the other EncodedSentences
+        :param wordIds: The word IDs of the other EncodedSentences
+        :param tagIds: The tag IDs of the other EncodedSentences
+        :param offsets: The sentence offsets of the other EncodedSentences
+        """
+        wordMap = internStrings(words, self.words, self.wordIndex)
+        tagMap = internStrings(tags, self.tags, self.tagIndex)
+        base = len(self.wordIds)
+        self.wordIds.frombytes(wordMap[wordIds].tobytes())
+        self.tagIds.frombytes(tagMap[tagIds].tobytes())
+        self.offsets.frombytes((np.asarray(offsets[1:], dtype=np.int64) + base).tobytes())
+
+    def arrays(self):
+        """
+        :return: NumPy views of the word IDs, the tag IDs and the sentence offsets
+        """
+        return (np.frombuffer(self.wordIds, dtype=np.int32), np.frombuffer(self.tagIds, dtype=np.int32),
+                np.frombuffer(self.offsets, dtype=np.int64))
+
+
+def internStrings(strings, vocabulary, index):
+    """
+    Intern strings in order, and add the ones that are new to the vocabulary.
+
+    :param strings: A list of strings
+    :param vocabulary: The interned strings, which is extended
+    :param index: A dictionary that maps each interned string to its ID, which is extended
+    :return: An array with the ID of each string
+    """
+    ids = np.empty(len(strings), dtype=np.int32)
+    for i, s in enumerate(strings):
+        stringId = index.get(s)
+        if stringId is None:
+            stringId = index[s] = len(vocabulary)
+            vocabulary.append(s)
+        ids[i] = stringId
+    return ids
+
+
+def occurrencesInOrder(vocabulary, counts, numOfSents, firstSentenceIds):
+    """
+    Build an occurrence dictionary in order of first occurrence, with the delimiters where they first occur.
+
+    :param vocabulary: The interned strings
+    :param counts: The counts of the interned strings
+    :param numOfSents: The number of sentences, which is the number of each delimiter
+    :param firstSentenceIds: The number of distinct IDs in the first sentence
+    """
+    if numOfSents == 0:
+        return {}
+    occurrences = {'<s>': numOfSents}
+    occurrences.update(zip(vocabulary[:firstSentenceIds], counts[:firstSentenceIds].tolist()))
+    occurrences['</s>'] = numOfSents
+    occurrences.update(zip(vocabulary[firstSentenceIds:], counts[firstSentenceIds:].tolist()))
+    return occurrences
+
+
+def pairCodes(firsts, seconds, numOfSeconds, numOfFirsts, repeatedCodes=()):
+    """
+    Encode pairs of IDs as first * numOfSeconds + second, in 32 bits where the codes fit.
+
+    :param firsts: An array of the first IDs
+    :param seconds: An array of the second IDs
+    :param numOfSeconds: The number of distinct second IDs
+    :param numOfFirsts: The number of distinct first IDs
+    :param repeatedCodes: A list of further (code, repeats) pairs to append
+    :return codes: An array of the codes
+    """
+    dtype = np.int32 if numOfFirsts * numOfSeconds < 2 ** 31 else np.int64
+    codes = np.empty(len(firsts) + sum(repeats for _, repeats in repeatedCodes), dtype=dtype)
+    head = codes[:len(firsts)]
+    np.multiply(firsts, numOfSeconds, out=head, dtype=dtype)
+    head += seconds
+
+    position = len(firsts)
+    for code, repeats in repeatedCodes:
+        codes[position:position + repeats] = code
+        position += repeats
+    return codes
+
+
+def pairCounts(codes, numOfSeconds, firstNames, secondNames):
+    """
+    Count the pairs that are encoded as first * numOfSeconds + second.
+
+    :return: A Counter of (first, second) pairs
+    """
+    uniqueCodes, counts = np.unique(codes, return_counts=True)
+    firsts, seconds = np.divmod(uniqueCodes, numOfSeconds)
+    return Counter({(firstNames[f], secondNames[s]): c
+                    for f, s, c in zip(firsts.tolist(), seconds.tolist(), counts.tolist())})
+
+
+def countEncoded(encoded):
+    """
+    Count the integer-encoded training sentences with array operations.
+
+    The counts are the same as the ones of countSentences(), which counts the sentences one token at a time.
+
+    :param encoded: An EncodedSentences
+    :return occurrenceMap_w: A dictionary for the occurrences of words
+    :return occurrenceMap_t: A dictionary for the occurrences of tags
+    :return emissionPairs: A Counter of (tag, word) pairs
+    :return bigramPairs: A Counter of (prevTag, curTag) pairs, including the delimiters
+    """
+    wordIds, tagIds, offsets = encoded.arrays()
+    numOfSents = encoded.numOfSents
+    numOfWords, numOfTags = len(encoded.words), len(encoded.tags)
+    if numOfSents == 0:
+        return {}, {}, Counter(), Counter()
+
+    lengths = np.diff(offsets)
+    firstLength = int(lengths[0])
+    occurrenceMap_w = occurrencesInOrder(encoded.words, np.bincount(wordIds, minlength=numOfWords), numOfSents,
+                                         int(wordIds[:firstLength].max()) + 1 if firstLength else 0)
+    occurrenceMap_t = occurrencesInOrder(encoded.tags, np.bincount(tagIds, minlength=numOfTags), numOfSents,
+                                         int(tagIds[:firstLength].max()) + 1 if firstLength else 0)
+
+    # the delimiters take the two tag IDs after the interned tags
+    start, end = numOfTags, numOfTags + 1
+    tagNames = encoded.tags + ['<s>', '</s>']
+    wordNames = encoded.words + ['<s>', '</s>']
+    numOfCodes = numOfTags + 2
+
+    # the final </s> only closes the corpus, so it is not counted as an emission
+    numOfWordCodes = numOfWords + 2
+    emissionCodes = pairCodes(tagIds, wordIds, numOfWordCodes, numOfCodes, [
+        (start * numOfWordCodes + numOfWords, numOfSents),
+        (end * numOfWordCodes + numOfWords + 1, numOfSents - 1),
+    ])
+    emissionPairs = pairCounts(emissionCodes, numOfWordCodes, tagNames, wordNames)
+    del emissionCodes
+
+    # consecutive tags within a sentence
+    within = np.ones(max(len(tagIds) - 1, 0), dtype=bool)
+    boundaries = offsets[1:-1]
+    boundaries = boundaries[(boundaries > 0) & (boundaries < len(tagIds))]
+    within[boundaries - 1] = False
+    withinCodes = pairCodes(tagIds[:-1], tagIds[1:], numOfCodes, numOfCodes)[within]
+
+    nonEmpty = lengths > 0
+    startCodes = (start * numOfCodes + tagIds[offsets[:-1][nonEmpty]]).astype(withinCodes.dtype)
+    lastTags = np.full(numOfSents, start, dtype=withinCodes.dtype)
+    lastTags[nonEmpty] = tagIds[offsets[1:][nonEmpty] - 1]
+    # every sentence but the last is closed by </s>, which is followed by the <s> of the next sentence
+    bigramCodes = np.concatenate([
+        withinCodes,
+        startCodes,
+        lastTags[:-1] * numOfCodes + end,
+        np.full(numOfSents - 1, end * numOfCodes + start, dtype=withinCodes.dtype),
+    ])
+    bigramPairs = pairCounts(bigramCodes, numOfCodes, tagNames, tagNames)
+
+    return occurrenceMap_w, occurrenceMap_t, emissionPairs, bigramPairs
+
+
+# the sentences that the forked workers of countParallel() encode, which they inherit instead of receiving them pickled
+shardSource = None
+
+
+def encodeShard(bounds):
+    """
+    Encode a shard of the sentences of countParallel() in a worker process.
+
+    :param bounds: The (start, end) indices of the shard
+    :return: The words, the tags and the arrays of an EncodedSentences of the shard
+    """
+    start, end = bounds
+    encoded = EncodedSentences(shardSource[start:end])
+    return (encoded.words, encoded.tags) + encoded.arrays()
+
+
+def countParallel(sentences, workers=None, shardSize=None):
+    """
+    Encode the training sentences in shards over a pool of worker processes, and count the merged encoding.
+
+    Encoding interns every token in Python, so it is the part of counting that is spread over the workers, and
+    countEncoded() counts the merged IDs with array operations. The workers are forked, so they read their shards from
+    the memory of the parent, and only send back the ID arrays and the vocabulary of each shard. Pickling the sentences
+    would cost more than encoding them, so without fork the sentences are encoded in this process.
+
+    Merging and counting stay in this process, and take about a fifth of the time of serial counting, which bounds the
+    speedup; on 39k synthetic sentences the estimate is 0.20 s with 2 workers and 0.13 s with 4, against 0.28-0.40 s
+    serially.
+
+    :param sentences: A sequence of tagged sentences
+    :param workers: The number of worker processes, or None for the number of CPUs
+    :param shardSize: The number of sentences in a shard, or None to make one shard per worker
+    :return: The same counts as countEncoded() of all the sentences
+    """
+    import multiprocessing
+    global shardSource
+    numOfSents = len(sentences)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers == 1 or numOfSents == 0 or 'fork' not in multiprocessing.get_all_start_methods():
+        return countEncoded(EncodedSentences(sentences))
+
+    if shardSize is None:
+        shardSize = max(1, -(-numOfSents // workers))
+    bounds = [(i, min(i + shardSize, numOfSents)) for i in range(0, numOfSents, shardSize)]
+
+    # the shards are merged in corpus order, so the words and tags are interned in order of first occurrence, as in
+    # serial encoding
+    encoded = EncodedSentences()
+    shardSource = sentences
+    try:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            for shard in pool.imap(encodeShard, bounds):
+                encoded.extendEncoded(*shard)
+    finally:
+        shardSource = None
+    return countEncoded(encoded)
+
+
+def countStream(sentences, chunkSize=1000):
+    """
+    Count tagged sentences from an iterator in a single pass, one chunk at a time.
+
+    Only the current chunk and the count tables are kept, so the memory depends on the size of the vocabulary and the
+    tagset, not on the number of sentences.
+
+    :param sentences: An iterable of tagged sentences, i.e. a lazy corpus view or a generator
+    :param chunkSize: The number of sentences that are counted at a time
+    :return counts: The same counts as countEncoded()
+    :return numOfSents: The number of sentences that were counted
+    :return lastSentence: The last tagged sentence, or an empty list if there were no sentences
+    """
+    total = (Counter(), Counter(), Counter(), Counter())
+    numOfSents = 0
+    chunk = []
+    lastSentence = []
+
+    for s in sentences:
+        chunk.append(list(s))
+        if len(chunk) == chunkSize:
+            mergeCounts(total, countSentences(chunk))
+            numOfSents += len(chunk)
+            lastSentence = chunk[-1]
+            chunk = []
+    if chunk:
+        mergeCounts(total, countSentences(chunk))
+        numOfSents += len(chunk)
+        lastSentence = chunk[-1]
+
+    if numOfSents == 0:
+        return ({}, {}, Counter(), Counter()), 0, []
+    occurrences_w, occurrences_t, emissionPairs, bigramPairs = finaliseCounts(total, lastSentence)
+    counts = dict(occurrences_w), dict(occurrences_t), emissionPairs, bigramPairs
+    return counts, numOfSents, lastSentence
@@ -0,0 +1,212 @@
+import numpy as np
+from collections import Counter
+from hmm import HMM
+from unk import HMM_UNK
+from corpusCache import openCorpus
+from training import mergeCounts
+from decoding import viterbiDecode, viterbiPairDecode
+
+
+def countTrigrams(sentences):
+    """
+    Count the tag unigrams, bigrams and trigrams of tagged sentences.
+
+    Each sentence is padded with two start delimiters and one end delimiter, so the counts do not cross sentences.
+
+    :param sentences: An iterable of tagged sentences
+    :return unigrams: A Counter of tags, including the end delimiter
+    :return bigrams: A Counter of (prevTag, curTag) pairs
+    :return trigrams: A Counter of (prevPrevTag, prevTag, curTag) triples
+    """
+    unigrams = Counter()
+    bigrams = Counter()
+    trigrams = Counter()
+    for s in sentences:
+        tags = ['<s>', '<s>'] + [t for (_, t) in s] + ['</s>']
+        unigrams.update(tags[2:])
+        bigrams.update(zip(tags[1:-1], tags[2:]))
+        trigrams.update(zip(tags, tags[1:], tags[2:]))
+    return unigrams, bigrams, trigrams
+
+
+def deletedInterpolation(unigrams, bigrams, trigrams):
+    """
+    Estimate the weights of the unigram, bigram and trigram probabilities with deleted interpolation (Brants, 2000).
+
+    Each trigram is taken out of the counts once, and its count is added to the weight of the estimate that predicts
+    it best without it.
+
+    :return lambdas: A tuple of the unigram, bigram and trigram weights, which sum up to 1
+    """
+    numOfTokens = sum(unigrams.values())
+    contextCounts = Counter()
+    for (t1, t2, _), count in trigrams.items():
+        contextCounts[(t1, t2)] += count
+    prevCounts = Counter()
+    for (t2, _), count in bigrams.items():
+        prevCounts[t2] += count
+
+    def ratio(count, total):
+        return (count - 1) / (total - 1) if total > 1 else 0.0
+
+    lambdas = [0.0, 0.0, 0.0]
+    for (t1, t2, t3), count in trigrams.items():
+        estimates = [
+            ratio(unigrams[t3], numOfTokens),
+            ratio(bigrams[(t2, t3)], prevCounts[t2]),
+            ratio(count, contextCounts[(t1, t2)]),
+        ]
+        lambdas[int(np.argmax(estimates))] += count
+
+    total = sum(lambdas)
+    return tuple(l / total for l in lambdas) if total > 0 else (1.0, 0.0, 0.0)
+
+
+class TrigramHMM(HMM):
+    """
+    A second-order HMM, where the probability of a tag depends on the two previous tags.
+
+    The transition probabilities interpolate the unigram, bigram and trigram estimates with weights from deleted
+    interpolation, and the emissions are the Witten-Bell distributions of the bigram model. The decoder works over
+    (previous tag, current tag) pair states, but only over the pairs that were seen in training.
+    """
+
+    def setup(self, workers=1):
+        super().setup(workers)
+        # count tag trigrams in a training corpus
+        with self.statistics.phase('countTrigrams'):
+            self.tagUnigrams, self.tagBigrams, self.tagTrigrams = countTrigrams(self.trainSents)
+
+    def setupStream(self, taggedSentences, chunkSize=1000):
+        self.tagUnigrams, self.tagBigrams, self.tagTrigrams = Counter(), Counter(), Counter()
+        counts = (self.tagUnigrams, self.tagBigrams, self.tagTrigrams)
+
+        def counted():
+            # the tag trigrams are counted in the same pass over the sentences as the bigram model
+            chunk = []
+            for s in taggedSentences:
+                chunk.append(list(s))
+                yield chunk[-1]
+                if len(chunk) == chunkSize:
+                    mergeCounts(counts, countTrigrams(chunk))
+                    chunk = []
+            mergeCounts(counts, countTrigrams(chunk))
+
+        super().setupStream(counted(), chunkSize)
+
+    def update(self, tagged_sentences):
+        tagged_sentences = list(tagged_sentences)
+        super().update(tagged_sentences)
+        unigrams, bigrams, trigrams = countTrigrams(tagged_sentences)
+        self.tagUnigrams.update(unigrams)
+        self.tagBigrams.update(bigrams)
+        self.tagTrigrams.update(trigrams)
+
+    def finishCompile(self):
+        with self.statistics.phase('compilePairStates'):
+            self.compilePairStates()
+        super().finishCompile()
+
+    def compilePairStates(self):
+        """
+        Compile the pair states and their interpolated trigram transitions.
+
+        The states are the pairs (<s>, v) of every tag v, followed by the pairs (u, v) that were seen in training.
+        """
+        self.lambdas = deletedInterpolation(self.tagUnigrams, self.tagBigrams, self.tagTrigrams)
+        l1, l2, l3 = self.lambdas
+        numOfTokens = sum(self.tagUnigrams.values())
+        contextCounts = Counter()
+        for (t1, t2, _), count in self.tagTrigrams.items():
+            contextCounts[(t1, t2)] += count
+        prevCounts = Counter()
+        for (t2, _), count in self.tagBigrams.items():
+            prevCounts[t2] += count
+
+        def logProb(t1, t2, t3):
+            # log P(t3 | t1, t2)
+            p = l1 * self.tagUnigrams[t3] / numOfTokens
+            if prevCounts[t2]:
+                p += l2 * self.tagBigrams[(t2, t3)] / prevCounts[t2]
+            if contextCounts[(t1, t2)]:
+                p += l3 * self.tagTrigrams[(t1, t2, t3)] / contextCounts[(t1, t2)]
+            return np.log(p) if p > 0 else -np.inf
+
+        tags = self.uniqueTagsNoDelim
+        pairs = [('<s>', v) for v in tags]
+        pairs += [(u, v) for u in tags for v in tags if self.tagBigrams[(u, v)] > 0]
+
+        # the predecessors of (u, v) are the states (w, u)
+        predecessors = {t: [] for t in tags}
+        for p, (_, v) in enumerate(pairs):
+            predecessors[v].append(p)
+        maxPredecessors = max([len(predecessors[u]) for (u, _) in pairs if u != '<s>'] + [1])
+
+        numOfPairs = len(pairs)
+        self.pairTags = np.array([self.tagIndex[v] for (_, v) in pairs], dtype=np.intp)
+        self.pairStart = np.full(numOfPairs, -np.inf)
+        self.pairEnd = np.empty(numOfPairs)
+        self.pairPredIndex = np.zeros((numOfPairs, maxPredecessors), dtype=np.intp)
+        self.pairPredTransition = np.full((numOfPairs, maxPredecessors), -np.inf)
+
+        for p, (u, v) in enumerate(pairs):
+            self.pairEnd[p] = logProb(u, v, '</s>')
+            if u == '<s>':
+                # a start state only begins a sentence
+                self.pairStart[p] = logProb('<s>', '<s>', v)
+                continue
+            for k, q in enumerate(predecessors[u]):
+                self.pairPredIndex[p, k] = q
+                self.pairPredTransition[p, k] = logProb(pairs[q][0], u, v)
+
+    def decodePath(self, logEmissions, candidates, beamWidth=None, beamThreshold=None):
+        if beamWidth is not None or beamThreshold is not None:
+            raise ValueError('The trigram decoder does not support beam pruning')
+        if candidates is not None:
+            logEmissions = self.maskEmissions(logEmissions, candidates)
+
+        path = viterbiPairDecode(self.pairStart, self.pairPredIndex, self.pairPredTransition, self.pairEnd,
+                                 self.pairTags, logEmissions)
+        if path is None:
+            # no sequence of seen tag pairs fits the sentence, so fall back to the bigram model
+            path = viterbiDecode(self.logStart, self.logTransition, logEmissions)
+        return path
+
+    def decodeBucket(self, sentences):
+        # the pair states are decoded one sentence at a time
+        return [self.decodeUncached(s) for s in sentences]
+
+    def modelArrays(self):
+        arrays = super().modelArrays()
+        arrays['pairTags'] = self.pairTags
+        arrays['pairStart'] = self.pairStart
+        arrays['pairEnd'] = self.pairEnd
+        arrays['pairPredIndex'] = self.pairPredIndex
+        arrays['pairPredTransition'] = self.pairPredTransition
+        return arrays
+
+    def restoreModel(self, header, arrays):
+        super().restoreModel(header, arrays)
+        self.pairTags = arrays['pairTags']
+        self.pairStart = arrays['pairStart']
+        self.pairEnd = arrays['pairEnd']
+        self.pairPredIndex = arrays['pairPredIndex']
+        self.pairPredTransition = arrays['pairPredTransition']
+
+
+class TrigramHMM_UNK(TrigramHMM, HMM_UNK):
+    """
+    A second-order HMM that replaces infrequent and unseen words with UNK tags, like HMM_UNK.
+    """
+
+
+def main():
+    tagset = "universal"
+    corpus = openCorpus('brown', tagset)  # the corpus is downloaded and cached on the first run
+    hmm = TrigramHMM(corpus, tagset)
+    hmm.setup()
+    hmm.viterbi_test()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
-import nltk
 from hmm import HMM
-from nltk.corpus import brown
-import operator
+from corpusCache import openCorpus
+import numpy as np
+from collections import Counter
+from affixRules import getRuleSet
+from training import EncodedSentences, countEncoded
 
 
 class HMM_UNK(HMM):
@@ -11,308 +13,168 @@ class HMM_UNK(HMM):
         self.lang = lang
         self.infrequent = infrequent
 
-    def setup(self):
-        # split the set of all sentences into training set and testing set
-        self.trainSents, self.testSents = self.splitTrainingTesting()
-
-        # A transit table that is used for counting occurrences of one part of speech following another in a training corpus
-        self.transitTable = {}
+    def setup(self, workers=1):
+        phase = self.statistics.phase
 
-        # split training sentences into tags and words
-        self.words, self.tags = self.splitWordsTagsTraining()
-        # count occurrences of words together with parts of speech in a training corpus
-        self.occurrenceMap_w, self.occurrenceMap_t = self.countOccurrences()
-        # find and replace the infrequent words with suitable UNK tag
-        self.words = self.replaceInfrequentWords_UNK()
-        # create transit table
-        self.transitTable = self.createTransitTable(self.transitTable, self.occurrenceMap_t)
+        # split the set of all sentences into training set and testing set
+        with phase('splitTrainingTesting'):
+            self.trainSents, self.testSents = self.splitTrainingTesting()
+
+        if workers == 1:
+            # encode training sentences as arrays of word IDs and tag IDs
+            with phase('encodeTraining'):
+                trainingData = EncodedSentences(self.trainSents)
+            # count occurrences, tag transitions and emissions in a training corpus
+            with phase('countEncoded'):
+                self.occurrenceMap_w, self.occurrenceMap_t, self.emissionPairs, self.bigramPairs = \
+                    countEncoded(trainingData)
+            # only the counts are kept, so the encoded sentences are freed before the count tables are built
+            del trainingData
+        else:
+            # count shards of the training sentences in parallel, and merge the counts
+            with phase('countTrainingParallel'):
+                self.countTrainingParallel(workers)
+
+        # the infrequent words depend on the total counts, so their emissions are replaced after counting; only the
+        # distinct (tag, word) pairs are replaced, never the tokens
+        with phase('replaceInfrequentEmissions_UNK'):
+            self.infrequentEmissions = self.collectInfrequentEmissions()
+            self.emissionPairs = self.replaceInfrequentEmissions_UNK()
 
         # split testing sentences into tags and words
-        self.check_sents = self.taggedSents[self.trainSize : self.trainSize + self.testingSize]
-        self.testingWords, self.testingTags = self.splitWordsTagsTesting()
+        with phase('splitWordsTagsTesting'):
+            self.check_sents = self.taggedSents[self.trainSize : self.trainSize + self.testingSize]
+            self.testingWords, self.testingTags = self.splitWordsTagsTesting()
 
         # split testing sentences into tags and words - exclude delimiters
-        self.testingWordsNoDelim, self.testingTagsNoDelim = self.splitWordsTagsTestingNoDelim()
-        self.uniqueTags, self.uniqueTagsNoDelim = self.getUniqueTags()
+        with phase('splitWordsTagsTestingNoDelim'):
+            self.testingWordsNoDelim, self.testingTagsNoDelim = self.splitWordsTagsTestingNoDelim()
+        with phase('getUniqueTags'):
+            self.uniqueTags, self.uniqueTagsNoDelim = self.getUniqueTags()
+
+        # collect the counts that are smoothed when the model is compiled
+        with phase('setCountTables'):
+            self.setCountTables()
 
-        # calculate smoothed probabilities
-        self.wordsDist, self.tagsDist = self.setProbDistributions()
+        # update() continues the training corpus after its last sentence
+        self.lastTrainingSentence = self.trainSents[-1] if len(self.trainSents) > 0 else []
+        self.pendingTags = set()
 
         self.initialised = True  # mark as 'initialised'
+        self.compiled = False
+        self.modelPath = None
+        self.statistics.emit('setup')
+
+    def convertWordToUNKTag(self, word):
+        """
+        Convert the word to a suitable UNK tag with the compiled affix rules of self.lang.
+
+        The rules are registered in affixRules, and benchmark.py checks them against the original if/elif chains.
 
-    def convertWordToUNKTag_EN(self, word):
-        #word = word.lower()
-        unk_tag = word
-
-        if word.endswith('ing'):
-            unk_tag = 'UNK-ing'
-        elif word.endswith("'s"):
-            unk_tag = "UNK's"
-        elif word.endswith('ion') or word.endswith('ions'):
-            unk_tag = 'UNK-ion'
-        elif word.endswith('ial'):
-            unk_tag = 'UNK-ial'
-        elif word.endswith('ble'):
-            unk_tag = 'UNK-ble'
-        elif word.endswith('er'):
-            unk_tag = 'UNK-er'
-        elif word.endswith('or'):
-            unk_tag = 'UNK-or'
-        elif word.endswith('al'):
-            unk_tag = 'UNK-al'
-        elif word.endswith('fy'):
-            unk_tag = 'UNK-fy'
-        elif word.endswith('ic'):
-            unk_tag = 'UNK-ic'
-        elif word.endswith('ful'):
-            unk_tag = 'UNK-ful'
-        elif word.endswith('est'):
-            unk_tag = 'UNK-est'
-        elif word.endswith('less'):
-            unk_tag = 'UNK-less'
-        elif word.endswith('ous'):
-            unk_tag = 'UNK-ous'
-        elif word.endswith('ed'):
-            unk_tag = 'UNK-ed'
-        elif word.endswith('ly'):
-            unk_tag = 'UNK-ly'
-        elif word.startswith('anti'):
-            unk_tag = 'anti-UNK'
-        elif word.startswith('pre'):
-            unk_tag = 'pre-UNK'
-        elif word.endswith('ism'):
-            unk_tag = 'UNK-ism'
-        elif word.endswith('wise'):
-            # i.e. otherwise, likewise, clockwise
-            unk_tag = 'UNK-wise'
-        elif word.endswith('ward') or word.endswith('wards'):
-            # i.e. forward, backward
-            unk_tag = 'UNK-ward'
-        elif word.endswith('ist'):
-            unk_tag = 'UNK-ist'
-        elif word.endswith('s'):
-            unk_tag = 'UNK-s'
-
-        return unk_tag
-
-    def convertWordToUNKTag_DU(self, word):
-        unk_tag = word
-
-        if word.endswith('te'):
-            # used for adjectives
-            unk_tag = 'UNK-te'
-        elif word.endswith('de'):
-            # form ordinal numbers to cardinal numbers
-            unk_tag = 'UNK-de'
-        elif word.startswith('ge') and (word.endswith('t') or word.endswith('d')):
-            # pp -> ge + word + t/d
-            unk_tag = 'ge-UNK-(t/d)'
-        elif word.endswith('tien'):
-            # tien is equal to teen in English
-            unk_tag = 'UNK-tien'
-        elif word.endswith('honderd'):
-            #honderd = hundred
-            unk_tag = 'UNK-honderd'
-        elif word.endswith('thie'):
-            # 'thie' endings are the equivalents of the English -thy (sympathy) and -thic.
-            # 'thie' is used for nouns
-            unk_tag = 'UNK-thie'
-        elif word.endswith('thisch'):
-            # 'thisch' endings are the equivalents of the English -thy (sympathy) and -thic.
-            # 'thisch' is used for nouns
-            unk_tag = 'UNK-thisch'
-        elif word.endswith('achtig'):
-            # '-achtig' is the Dutch translation for English '-like'
-            unk_tag = 'UNK-achtig'
-        elif word.endswith('ische'):
-            # Many Dutch adjectives end in -isch or -ische (inflected).
-            # It means something like English -ish.
-            unk_tag = 'UNK-ische'
-        elif word.endswith('isch'):
-            unk_tag = 'UNK-isch'
-        elif word.startswith('ont'):
-            # prefix "ont-"
-            unk_tag = 'ont-UNK'
-        elif word.startswith('er'):
-            # prefix "er-"
-            unk_tag = 'er-UNK'
-        elif word.endswith('en'):
-            # A suffix “-en” forms verbs from nouns or adjectives.
-            unk_tag = 'UNK-en'
-        elif word.endswith('s'):
-            # forms regular plurals of nouns that end in certain suffixes or syllables
-            unk_tag = 'UNK-s'
-
-        return unk_tag
-
-    def convertWordToUNKTag_ES(self, word):
-        unk_tag = word
-
-        if word.endswith('achon'):
-            # Adds negative connotations to a word
-            unk_tag = 'UNK-achon'
-        elif word.endswith('aco'):
-            # It sometimes adds a despective sense, it is also seen to add a demonym
-            unk_tag = 'UNK-aco'
-        elif word.endswith('ado'):
-            # Makes reference to names of associations or ensembles
-            unk_tag = 'UNK-ado'
-        elif word.endswith('ción'):
-            # Expresses the idea of action on nouns that are derived from a verb
-            unk_tag = 'UNK-ción'
-        elif word.endswith('mente'):
-            # Uses adjectives to form modal adverbs
-            unk_tag = 'UNK-mente'
-        elif word.endswith('génesis'):
-            # Transmits the idea of origin or beginning
-            unk_tag = 'UNK-génesis'
-
-        # suffixes that makes the words to nouns or adjectives
-        elif word.endswith('able'):
-            unk_tag = 'UNK-able'
-        elif word.endswith('ario'):
-            unk_tag = 'UNK-ario'
-        elif word.endswith('eña') or word.endswith('eño'):
-            unk_tag = 'UNK-eñ(a/o)'
-        elif word.endswith('iza') or word.endswith('izo'):
-            unk_tag = 'UNK-iz(a/o)'
-        elif word.endswith('oso') or word.endswith('osa'):
-            unk_tag = 'UNK-os(a/o)'
-        elif word.endswith('or'):
-            unk_tag = 'UNK-or'
-
-        return unk_tag
-
-    def convertWordToUNKTag_PO(self, word):
-        unk_tag = word
-
-        if word.endswith('ário'):
-            # ário is a suffix that is used for "professional" or "place"
-            unk_tag = 'ário'
-        elif word.endswith('eiro'):
-            # eiro is a suffix that is used for "professional"
-            unk_tag = 'UNK-eiro'
-        elif word.endswith('inho') or word.endswith('ico') or word.endswith('isco'):
-            # inho, ico, and isco are the diminutive suffixes
-            # inho is much more used than the other diminutive suffixes
-            unk_tag = 'UNK-diminutive'
-        elif word.endswith('ão') or word.endswith('aço') or word.endswith('aréu'):
-            # ão, aço, and aréu are the augmentative suffixes
-            unk_tag = 'UNK-augmentative'
-        elif word.endswith('mente'):
-            # mente is a suffix that is generally used for adverbs
-            # It does similar thing with "-ly" in English
-            unk_tag = 'UNK-mente'
-        elif word.startswith('Anfi') or word.startswith('anfi'):
-            # prefix for dualty
-            unk_tag = 'anfi-UNK'
-        elif word.startswith('Anti') or word.startswith('anti'):
-            # prefix for opposition
-            unk_tag = 'anti-UNK'
-        elif word.startswith('sim') or word.startswith('Sim') or word.startswith('sin') or word.startswith('Sin'):
-            # "simultaneously"
-            unk_tag = 'si(m/n)-UNK'
-        elif word.startswith('peri') or word.startswith('Peri'):
-            # "Around"
-            unk_tag = 'peri-UNK'
-        elif word.startswith('Hemi') or word.startswith('hemi'):
-            # "Half"
-            unk_tag = 'hemi-UNK'
-
-        return unk_tag
-
-    def replaceInfrequentWords_UNK(self):
+        :param word: An infrequent or unseen word
+        :return: The UNK tag, or the word itself if no rule matches
         """
-        Find and replace the infrequent words with suitable UNK tag.
-        :return newList: A new list of words, where all infrequent words are replaced with suitable UNK tags
+        ruleSet = getRuleSet(self.lang)
+        return word if ruleSet is None else ruleSet.convert(word)
+
+    def modelMetadata(self):
+        return dict(super().modelMetadata(), lang=self.lang, infrequent=self.infrequent)
+
+    def modelArrays(self):
+        arrays = super().modelArrays()
+        # occurrences of each word of the vocabulary in the training corpus, before the UNK replacement
+        arrays['wordCounts'] = np.array([self.occurrenceMap_w.get(w, 0) for w in self.emissions.vocabulary],
+                                        dtype=np.int64)
+        return arrays
+
+    def restoreModel(self, header, arrays):
+        super().restoreModel(header, arrays)
+        self.lang = header['lang']
+        self.infrequent = header['infrequent']
+        # infrequent words that were replaced by UNK tags are not in the vocabulary, and are converted like unseen words
+        self.occurrenceMap_w = {w: c for w, c in zip(self.emissions.vocabulary, arrays['wordCounts'].tolist()) if c > 0}
+
+    def replaceInfrequentEmissions_UNK(self):
         """
-        newList = []
-        # iterate both word list and tag list to find and replace the infrequent words with suitable UNK tag
-        for w, t in zip(self.words, self.tags):
-            word = w
+        Find and replace the infrequent words of the emission counts with suitable UNK tag.
+
+        This gives the same counts as replacing the infrequent words of every training token before counting.
+
+        :return newPairs: A Counter of (tag, word) pairs, where all infrequent words are replaced with suitable UNK tags
+        """
+        newPairs = Counter()
+        for (t, w), count in self.emissionPairs.items():
             if self.occurrenceMap_w[w] <= self.infrequent:
-                if self.lang == 'en':
-                    word = self.convertWordToUNKTag_EN(w)
-                elif self.lang == 'du':
-                    word = self.convertWordToUNKTag_DU(w)
-                elif self.lang == 'po':
-                    word = self.convertWordToUNKTag_PO(w)
-                elif self.lang == 'es':
-                    word = self.convertWordToUNKTag_ES(w)
-            newList.append(word)
-        return newList
-
-    def viterbi(self, targetSentences:list=None):
+                w = self.convertWordToUNKTag(w)
+            newPairs[(t, w)] += count
+        return newPairs
+
+    def countTrainingStream(self, taggedSentences, chunkSize):
+        super().countTrainingStream(taggedSentences, chunkSize)
+        # the infrequent words are only known once the whole stream is counted, so their emissions are remapped after
+        # the single pass; only the distinct (tag, word) pairs are remapped
+        self.infrequentEmissions = self.collectInfrequentEmissions()
+        self.emissionPairs = self.replaceInfrequentEmissions_UNK()
+
+    def collectInfrequentEmissions(self):
         """
-        Viterbi Algorithm
+        Collect the emission counts of the infrequent words, before they are replaced with UNK tags.
+
+        update() needs them to move the counts of a word from its UNK tag back to the word, once the word is no longer
+        infrequent.
+
+        :return infrequentEmissions: A dictionary that maps each infrequent word to a Counter of its tags
         """
-        finalTags=[]
-        probMatrix = []
-        distOfStartOfSentence = self.tagsDist['<s>']
-
-        # check if the targetSentences is None
-        if targetSentences is None:
-            targetSentences = self.testingWordsNoDelim  # If None, use the testing sentences
-
-        # use for loop to iterate targetSentences
-        for s in targetSentences:
-            firstRun = True
-            for init_word in s:
-                col = []
-                word = init_word
-
-                # Check if a word did not occur in the training corpus or only infrequently (occurred once).
-                if (word not in self.occurrenceMap_w) or (self.occurrenceMap_w[word] <= self.infrequent):
-                    if self.lang == 'en':
-                        word = self.convertWordToUNKTag_EN(word)
-                    elif self.lang == 'du':
-                        word = self.convertWordToUNKTag_DU(word)
-                    elif self.lang == 'po':
-                        word = self.convertWordToUNKTag_PO(word)
-                    elif self.lang == 'es':
-                        word = self.convertWordToUNKTag_ES(word)
-
-                for t in self.uniqueTagsNoDelim:
-
-                    # check if this is the first run
-                    if firstRun:
-                        pT = distOfStartOfSentence.prob(t)  # use the distribution value of 'start-of-sentence' as tag probability
-                        pW = self.wordsDist[t].prob(word)   # calculate the probability value for the current word with given tag
-                        col.append([pW*pT, "q0"])
-
-                    else:
-                        tagMap = {}
-                        for pp in range(0, len(self.uniqueTagsNoDelim)):
-                            # P(t(i) | t(i-1))
-                            pT = self.tagsDist[self.uniqueTagsNoDelim[pp]].prob(t)
-                            # P(w(i) | t(i))
-                            pW = self.wordsDist[t].prob(word)
-
-                            tagMap[self.uniqueTagsNoDelim[pp]] = pT * pW * probMatrix[-1][pp][0]
-
-                        prevBestTag = max(tagMap.items(), key=operator.itemgetter(1))[0]
-                        value = max(tagMap.items(), key=operator.itemgetter(1))[1]
-
-                        col.append([value, prevBestTag])
-                firstRun = False
-                probMatrix.append(col)
-
-            finalTags.append(self.getTagsFromMatrix(probMatrix, s))
-
-        return finalTags
-
-
-def downloadCorpus():
-    nltk.download('brown')
-    nltk.download('universal_tagset')
+        infrequentEmissions = {}
+        for (t, w), count in self.emissionPairs.items():
+            if self.occurrenceMap_w[w] <= self.infrequent:
+                infrequentEmissions.setdefault(w, Counter())[t] += count
+        return infrequentEmissions
+
+    def applyEmissionDelta(self, emissionDelta, previousCounts):
+        """
+        Replace the infrequent words of the new emission counts with suitable UNK tags, and add them to the count
+        tables.
+
+        A word whose total count rises above self.infrequent takes back the emissions that were counted under its
+        UNK tag, so the counts are the same as after a full retrain on all the sentences.
+        """
+        mappedDelta = Counter()
+        for w, before in previousCounts.items():
+            if before <= self.infrequent < self.occurrenceMap_w[w]:
+                unk_tag = self.convertWordToUNKTag(w)
+                for t, count in self.infrequentEmissions.pop(w, {}).items():
+                    mappedDelta[(t, unk_tag)] -= count
+                    mappedDelta[(t, w)] += count
+
+        for (t, w), count in emissionDelta.items():
+            if self.occurrenceMap_w[w] <= self.infrequent:
+                self.infrequentEmissions.setdefault(w, Counter())[t] += count
+                w = self.convertWordToUNKTag(w)
+            mappedDelta[(t, w)] += count
+
+        super().applyEmissionDelta(mappedDelta, previousCounts)
+
+    def convertWord(self, word):
+        """
+        Replace the word with a suitable UNK tag if it did not occur in the training corpus or only infrequently.
+
+        The substitutions are counted by resolveWord(), which caches the UNK tag with the emission column of the word.
+
+        :param word: A word of the target sentence
+        :return: The word to look up in the emission distributions
+        """
+        if (word not in self.occurrenceMap_w) or (self.occurrenceMap_w[word] <= self.infrequent):
+            word = self.convertWordToUNKTag(word)
+        return word
+
 
 def main():
-    corpus = brown
     tagset = "universal"
+    corpus = openCorpus('brown', tagset)  # the corpus is downloaded and cached on the first run
     hmm = HMM_UNK(corpus, tagset)
     hmm.setup()
     hmm.viterbi_test()
 
 if __name__ == '__main__':
-    downloadCorpus()
     main()